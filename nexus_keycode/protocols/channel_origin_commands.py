@@ -1,11 +1,20 @@
 import enum
-import bitstring
-import siphash
+import struct
 
-from nexus_keycode.protocols.utils import full_obscure
+from nexus_keycode.protocols.utils import digest_to_int, full_obscure, siphash24
 
 NEXUS_MODULE_VERSION_STRING = "1.0.0"
 
+# Little-endian MAC inputs, packed as
+# (controller command count, origin command type code, command value)
+_GENERIC_CONTROLLER_ACTION_STRUCT = struct.Struct("<IBI")
+# (controller command count, type code, Nexus authority ID, Nexus device ID)
+_SPECIFIC_ACCESSORY_STRUCT = struct.Struct("<IBHI")
+# (accessory command count,)
+_ACCESSORY_CHALLENGE_STRUCT = struct.Struct("<I")
+# (controller command count, type code, challenge digits as int)
+_LINK_COMMAND_AUTH_STRUCT = struct.Struct("<IBI")
+
 """
 Nexus Channel Origin Commands. Generated by an 'origin' (typically a backend
 server) to update the Nexus Channel security state of one controller and
@@ -122,6 +131,8 @@ class ChannelOriginCommandToken(object):
         self.auth = auth
         # Diagnostic only, not included in transmitted message
         self.controller_command_count = controller_command_count
+        # Computed on first call to `to_digits`; tokens are immutable
+        self._obscured_digits = None
 
     def __str__(self):
         return self.to_digits()
@@ -140,16 +151,15 @@ class ChannelOriginCommandToken(object):
     def to_digits(self, obscured=True):
         # type: (bool) -> str
         # String of digits making up this Nexus Channel "Token".
+        if obscured and self._obscured_digits is not None:
+            return self._obscured_digits
 
-        result = "{}{}{}".format(
-            self.type_code,
-            self.body,
-            self.auth
-        )
+        result = str(self.type_code) + self.body + self.auth
         if obscured:
             # obscure all digits except MAC/auth
             obscured_digit_count = len(result) - len(str(self.auth))
             result = full_obscure(result, obscured_digit_count=obscured_digit_count)
+            self._obscured_digits = result
 
         return result
 
@@ -159,10 +169,30 @@ class ChannelOriginCommandToken(object):
 
         Defaults to 6, may be increased.
         """
-        format_str = "{{:0{}d}}".format(digits)
-        return format_str.format(
-            siphash_function.hash() & 0xffffffff
-        )[-digits:]
+        return ChannelOriginCommandToken.digits_from_digest(
+            siphash_function.digest(), digits=digits
+        )
+
+    @classmethod
+    def digits_from_auth(cls, auth, digits=6):
+        """ Return the least-significant digits from a computed Siphash.
+
+        `auth` is an 8-byte Siphash digest, or (for backwards compatibility)
+        a `siphash.SipHash_2_4` object which has consumed the MAC inputs.
+        """
+        if isinstance(auth, (bytes, bytearray)):
+            return cls.digits_from_digest(auth, digits=digits)
+        return cls.digits_from_siphash(auth, digits=digits)
+
+    @staticmethod
+    def digits_from_digest(digest, digits=6):
+        """ Return the least-significant digits from an 8-byte Siphash digest.
+
+        Defaults to 6, may be increased.
+        """
+        return "{:0{}d}".format(
+            (digest_to_int(digest) & 0xffffffff) % 10 ** digits, digits
+        )
 
 
 class GenericControllerActionToken(ChannelOriginCommandToken):
@@ -183,7 +213,7 @@ class GenericControllerActionToken(ChannelOriginCommandToken):
         super(GenericControllerActionToken, self).__init__(
             type_=self._origin_command_type,
             body=controller_command,
-            auth=self.digits_from_siphash(auth),
+            auth=self.digits_from_auth(auth),
             controller_command_count=controller_command_count
         )
 
@@ -219,21 +249,14 @@ class GenericControllerActionToken(ChannelOriginCommandToken):
 
         controller_command_value = type_.value
 
-        packed_target_inputs = bitstring.pack(
-            [
-                "uintle:32=controller_command_count",
-                "uintle:8=origin_command_type_code",  # '0'
-                "uintle:32=controller_command_value",  # packed as uint32
-            ],
-            controller_command_count=controller_command_count,
-            origin_command_type_code=cls._origin_command_type.value,
-            controller_command_value=controller_command_value,
-        ).bytes
+        packed_target_inputs = _GENERIC_CONTROLLER_ACTION_STRUCT.pack(
+            controller_command_count,
+            cls._origin_command_type.value,  # '0'
+            controller_command_value,  # packed as uint32
+        )
         assert len(packed_target_inputs) == 9
 
-        auth = siphash.SipHash_2_4(
-            controller_sym_key,
-            packed_target_inputs)
+        auth = siphash24(controller_sym_key, packed_target_inputs)
 
         return cls(
             type_=type_,
@@ -269,7 +292,7 @@ class SpecificLinkedAccessoryToken(ChannelOriginCommandToken):
         super(SpecificLinkedAccessoryToken, self).__init__(
             type_=type_,
             body=truncated_accessory_nexus_id,
-            auth=self.digits_from_siphash(auth),
+            auth=self.digits_from_auth(auth),
             controller_command_count=controller_command_count
         )
 
@@ -316,24 +339,15 @@ class SpecificLinkedAccessoryToken(ChannelOriginCommandToken):
         nexus_authority_id = (accessory_nexus_id & 0xFFFF00000000) >> 32
         nexus_device_id = accessory_nexus_id & 0xFFFFFFFF
 
-        packed_target_inputs = bitstring.pack(
-            [
-                "uintle:32=controller_command_count",
-                "uintle:8=origin_command_type_code",  # '2' or '3'
-                "uintle:16=nexus_authority_id",
-                "uintle:32=nexus_device_id",
-            ],
-            controller_command_count=controller_command_count,
-            origin_command_type_code=type_.value,
-            nexus_authority_id=nexus_authority_id,
-            nexus_device_id=nexus_device_id
-        ).bytes
+        packed_target_inputs = _SPECIFIC_ACCESSORY_STRUCT.pack(
+            controller_command_count,
+            type_.value,  # '2' or '3'
+            nexus_authority_id,
+            nexus_device_id,
+        )
 
         assert len(packed_target_inputs) == 11
-        auth = siphash.SipHash_2_4(
-            controller_sym_key,
-            packed_target_inputs
-        )
+        auth = siphash24(controller_sym_key, packed_target_inputs)
 
         return cls(
             type_=type_,
@@ -410,44 +424,33 @@ class LinkCommandToken(ChannelOriginCommandToken):
         assert len(controller_sym_key) == 16
 
         # this auth is the 'challenge result' which accessory will validate
-        packed_target_inputs = bitstring.pack(
-            ["uintle:32=accessory_command_count"],
-            accessory_command_count=int(accessory_command_count)
-        ).bytes
-        assert len(packed_target_inputs) == 4
-        accessory_auth = siphash.SipHash_2_4(
-            accessory_sym_key,
-            packed_target_inputs
+        packed_target_inputs = _ACCESSORY_CHALLENGE_STRUCT.pack(
+            int(accessory_command_count)
         )
+        assert len(packed_target_inputs) == 4
+        accessory_auth = siphash24(accessory_sym_key, packed_target_inputs)
 
         # 6-digits
-        accessory_auth_digits = cls.digits_from_siphash(accessory_auth)
+        accessory_auth_digits = cls.digits_from_digest(accessory_auth)
 
         # This auth is used by the receiver of the origin command.
         # the receiver (controller) will unpack the challenge digits as
         # a message 'body', and recompute a MAC using these. Only if the
         # computed MAC is valid (matches the transmitted MAC)
         # will the challenge digits be passed onward to the accessory.
-        packed_auth_inputs = bitstring.pack(
-            [
-                "uintle:32=controller_command_count",
-                "uintle:8=command_type_code",  # '9'
-                "uintle:32=challenge_digits_int",  # challenge digits as int
-            ],
-            controller_command_count=controller_command_count,
-            command_type_code=command_type.value,
-            challenge_digits_int=int(accessory_auth_digits)
+        packed_auth_inputs = _LINK_COMMAND_AUTH_STRUCT.pack(
+            controller_command_count,
+            command_type.value,  # '9'
+            int(accessory_auth_digits),  # challenge digits as int
         )
-        assert len(packed_auth_inputs.tobytes()) == 9
+        assert len(packed_auth_inputs) == 9
 
-        auth = siphash.SipHash_2_4(
-            controller_sym_key,
-            packed_auth_inputs.bytes)
+        auth = siphash24(controller_sym_key, packed_auth_inputs)
 
         return cls(
             type_=command_type,
             body=accessory_auth_digits,
-            auth=cls.digits_from_siphash(auth),
+            auth=cls.digits_from_digest(auth),
             controller_command_count=controller_command_count,
             accessory_command_count=accessory_command_count,
         )
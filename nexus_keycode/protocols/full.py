@@ -1,8 +1,6 @@
 import enum
-import math
 
 import bitstring
-import siphash
 
 from typing import Any  # noqa F401
 
@@ -10,7 +8,13 @@ from nexus_keycode.protocols.passthrough_uart import (
     compute_passthrough_uart_keycode_numeric_body_and_mac,
 )
 from nexus_keycode.protocols.channel_origin_commands import ChannelOriginAction
-from nexus_keycode.protocols.utils import full_deobscure, full_obscure
+from nexus_keycode.protocols.utils import (
+    digest_to_int,
+    full_deobscure,
+    full_obscure,
+    siphash24,
+    siphash_from_schedule,
+)
 
 NEXUS_MODULE_VERSION_STRING = "1.1.0"
 NEXUS_INTEGRITY_CHECK_FIXED_00_KEY = b"\x00" * 16
@@ -87,7 +91,9 @@ class BaseFullMessage(object):
     :see: :class:`FullMessage`
     """
 
-    def __init__(self, full_id, message_type, body, secret_key, is_factory):
+    def __init__(
+        self, full_id, message_type, body, secret_key, is_factory, schedule=None
+    ):
         """
         Secret key provided must be pseudorandom, the first 16 bytes (if
         provided key is longer than 16 bytes) is used for a hashing operation
@@ -101,13 +107,17 @@ class BaseFullMessage(object):
         :type body: str
         :param secret_key: secret hash key (requires 16 bytes, uses first 16)
         :type secret_key: `bytes`
+        :param schedule: output of :func:`siphash_key_schedule`, used
+            instead of `secret_key`
+        :type schedule: `tuple`
         """
 
         if message_type not in [e for e in FullMessageType]:
             raise ValueError("unsupported credit message type code")
 
         # Siphash requires a 16-byte input key.
-        self.secret_key = secret_key[:16]
+        self.secret_key = secret_key[:16] if secret_key is not None else None
+        self._schedule = schedule
         self.is_factory = is_factory
 
         self.full_id = full_id
@@ -131,6 +141,7 @@ class BaseFullMessage(object):
                 self.message_type.value, (full_id & 0x3F)
             )
 
+        self._raw_obscured_digits = None
         self.mac = None
         # no need to generate MAC for passthrough keycode
         if self.message_type != FullMessageType.PASSTHROUGH_COMMAND:
@@ -181,23 +192,40 @@ class BaseFullMessage(object):
         :rtype: :class:`str`
         """
 
+        if obscured or (obscured is not False and not self.is_factory):
+            keycode = self._compute_obscured_digits()
+        else:
+            keycode = self._raw_digits()
+
+        return self._format(keycode, prefix, suffix, separator, group_len)
+
+    def _raw_digits(self):
         keycode = self.header + self.body
 
         # Passthrough keycodes do not contain a MAC
         if self.mac is not None:
             keycode += self.mac
 
-        if obscured or (obscured is not False and not self.is_factory):
+        return keycode
+
+    def _compute_obscured_digits(self):
+        # Obscuring is independent of the rendering options and the message
+        # is immutable, so compute it once and reuse it on subsequent calls.
+        if self._raw_obscured_digits is None:
+            keycode = self._raw_digits()
             # Obscured activation keycodes are always 14 digits in length
             assert len(keycode) == 14
-            keycode = full_obscure(keycode)
+            self._raw_obscured_digits = full_obscure(keycode)
+
+        return self._raw_obscured_digits
 
-        keycode = separator.join(
-            keycode[i * group_len : (i + 1) * group_len]
-            for i in range(int(math.ceil(len(keycode) / float(group_len))))
+    @staticmethod
+    def _format(digits, prefix, suffix, separator, group_len):
+        grouped = separator.join(
+            [digits[i : i + group_len] for i in range(0, len(digits), group_len)]
         )
 
-        return prefix + keycode + suffix
+        return prefix + grouped + suffix
 
     def _generate_mac(self):
         # generate the internal, *truncated* MAC digits for this message
@@ -205,8 +233,6 @@ class BaseFullMessage(object):
         # 4 = full_message_id (as uint32_t)
         # 1 = message_type (as uint8_t)
         # 4 = contents of body (as uint32_t)
-        function = siphash.SipHash_2_4(self.secret_key)
-
         packed_for_check = bitstring.pack(
             [
                 "uintle:32=full_id",
@@ -218,10 +244,19 @@ class BaseFullMessage(object):
             body_int=self.body_int,
         )
 
-        function.update(packed_for_check.bytes)
+        if self._schedule is not None:
+            check = (
+                siphash_from_schedule(self._schedule)
+                .update(packed_for_check.bytes)
+                .hash()
+            )
+        elif self.secret_key is not None:
+            check = digest_to_int(siphash24(self.secret_key, packed_for_check.bytes))
+        else:
+            raise ValueError("secret_key or schedule is required")
 
         # check/MAC is the lowest 6 decimal digits from the computed check
-        return u"{:06d}".format(function.hash() & 0xFFFFFFFF)[-6:]
+        return u"{:06d}".format((check & 0xFFFFFFFF) % 1000000)
 
 
 @enum.unique
@@ -234,7 +269,9 @@ class PassthroughApplicationId(enum.Enum):
 class FullMessage(BaseFullMessage):
     UNLOCK_FLAG_IN_HOURS = 99999
 
-    def __init__(self, full_id, message_type, body, secret_key, is_factory=False):
+    def __init__(
+        self, full_id, message_type, body, secret_key, is_factory=False, schedule=None
+    ):
         super(FullMessage, self).__init__(
             # 'full' message
             full_id=full_id,
@@ -242,10 +279,11 @@ class FullMessage(BaseFullMessage):
             body=body,
             secret_key=secret_key,
             is_factory=is_factory,
+            schedule=schedule,
         )
 
     @classmethod
-    def add_credit(cls, id_, hours, secret_key):
+    def add_credit(cls, id_, hours, secret_key=None, schedule=None):
         """Increase device's enabled credit by a specified amount
 
         :param id_: Message ID
@@ -254,6 +292,9 @@ class FullMessage(BaseFullMessage):
         :type hours: :class:`int`
         :param secret_key: Device's secret_key
         :type secret_key: `str`
+        :param schedule: output of :func:`siphash_key_schedule`, used
+            instead of `secret_key`
+        :type schedule: `tuple`
         :return: Message object of format ADD_CREDIT
         :rtype: :class:`FullMessage`
         """
@@ -262,10 +303,11 @@ class FullMessage(BaseFullMessage):
             message_type=FullMessageType.ADD_CREDIT,
             body=u"{0:05d}".format(hours),
             secret_key=secret_key,
+            schedule=schedule,
         )
 
     @classmethod
-    def set_credit(cls, id_, hours, secret_key):
+    def set_credit(cls, id_, hours, secret_key=None, schedule=None):
         """Set device's enabled credit to specified amount
 
         :param id_: Message ID
@@ -274,6 +316,9 @@ class FullMessage(BaseFullMessage):
         :type hours: :class:`int`
         :param secret_key: Device's secret_key
         :type secret_key: `str`
+        :param schedule: output of :func:`siphash_key_schedule`, used
+            instead of `secret_key`
+        :type schedule: `tuple`
         :return: Message object of format SET_CREDIT
         :rtype: :class:`FullMessage`
         """
@@ -282,16 +327,20 @@ class FullMessage(BaseFullMessage):
             message_type=FullMessageType.SET_CREDIT,
             body=u"{0:05d}".format(hours),
             secret_key=secret_key,
+            schedule=schedule,
         )
 
     @classmethod
-    def unlock(cls, id_, secret_key):
+    def unlock(cls, id_, secret_key=None, schedule=None):
         """Unlock a device
 
         :param id_: Message ID
         :type id_: :class:`int`
         :param secret_key: Device's secret_key
         :type secret_key: `str`
+        :param schedule: output of :func:`siphash_key_schedule`, used
+            instead of `secret_key`
+        :type schedule: `tuple`
         :return: Message object of format SET_CREDIT
         :rtype: :class:`FullMessage`
         """
@@ -300,6 +349,7 @@ class FullMessage(BaseFullMessage):
             message_type=FullMessageType.SET_CREDIT,
             body=u"{0:05d}".format(cls.UNLOCK_FLAG_IN_HOURS),
             secret_key=secret_key,
+            schedule=schedule,
         )
 
     @classmethod
@@ -307,7 +357,7 @@ class FullMessage(BaseFullMessage):
         raise ValueError("reserved is unsupported")
 
     @classmethod
-    def wipe_state(cls, id_, flags, secret_key):
+    def wipe_state(cls, id_, flags, secret_key=None, schedule=None):
         """Induce device to wipe state according to target flags rules
 
         :param id_: Full Message ID
@@ -316,6 +366,9 @@ class FullMessage(BaseFullMessage):
         :type flags: :class:`FullMessageWipeFlags`
         :param secret_key: Device's secret_key
         :type secret_key: `str`
+        :param schedule: output of :func:`siphash_key_schedule`, used
+            instead of `secret_key`
+        :type schedule: `tuple`
         :return: Message object of format WIPE_STATE
         :rtype: :class:`FullMessage`
         """
@@ -327,6 +380,7 @@ class FullMessage(BaseFullMessage):
             message_type=FullMessageType.WIPE_STATE,
             body=u"{0:1d}{1:04d}".format(0, flags.value),
             secret_key=secret_key,
+            schedule=schedule,
         )
 
 
@@ -1,6 +1,4 @@
-import siphash
-
-from nexus_keycode.protocols.utils import generate_mac
+from nexus_keycode.protocols.utils import generate_mac, siphash24
 
 NEXUS_INTEGRITY_CHECK_FIXED_00_KEY = b"\x00" * 16
 
@@ -10,6 +8,8 @@ def compute_uart_security_key(secret_key):
     :param secret_key: secret key used to generate UART security key
     :type secret_key: byte
     """
+    if not isinstance(secret_key, (bytes, bytearray)):
+        raise TypeError("UART base key must be bytes, not {}".format(type(secret_key)))
     # Only 16 byte keys are accepted
     assert len(secret_key) == 16
     # Split given key in half
@@ -17,12 +17,8 @@ def compute_uart_security_key(secret_key):
     key_part_b = secret_key[len(secret_key) // 2 :]
 
     # Hash both parts of the key - digest into hex strings
-    hash_part_a = siphash.SipHash_2_4(
-        NEXUS_INTEGRITY_CHECK_FIXED_00_KEY, key_part_a
-    ).digest()
-    hash_part_b = siphash.SipHash_2_4(
-        NEXUS_INTEGRITY_CHECK_FIXED_00_KEY, key_part_b
-    ).digest()
+    hash_part_a = siphash24(NEXUS_INTEGRITY_CHECK_FIXED_00_KEY, key_part_a)
+    hash_part_b = siphash24(NEXUS_INTEGRITY_CHECK_FIXED_00_KEY, key_part_b)
 
     # Return hashed halves as completed uart_security_key
     return hash_part_a + hash_part_b
@@ -1,18 +1,26 @@
 import logging
 
 import enum
-import math
+import struct
 
 import bitstring
-import siphash
-from typing import Optional
+from typing import Any, List, Optional  # noqa F401
 
-from nexus_keycode.protocols.utils import ints_to_bytes, pseudorandom_bits
+from nexus_keycode.protocols.utils import (
+    digest_to_int,
+    ints_to_bytes,
+    pseudorandom_bits,
+    siphash24,
+    siphash24_batch,
+    siphash_from_schedule,
+)
 
 NEXUS_MODULE_VERSION_STRING = "1.2.0"
 
 logger = logging.getLogger(__name__)
 
+_EXTENDED_MAC_INPUT_STRUCT = struct.Struct("<IBH")
+
 
 @enum.unique
 class SmallMessageType(enum.Enum):
@@ -62,7 +70,7 @@ class SmallMessage(object):
 
     UNLOCK_FLAG = object()
 
-    def __init__(self, id_, message_type, body, secret_key):
+    def __init__(self, id_, message_type, body, secret_key, schedule=None):
         """
         Create a message per the small protocol.  Such messages are
         15 digits long (when represented as decimal). Secret key provided
@@ -78,6 +86,9 @@ class SmallMessage(object):
         :type body: `int`
         :param secret_key: secret hash key (requires 16 bytes, uses first 16)
         :type secret_key: `str`
+        :param schedule: output of :func:`siphash_key_schedule`, used
+            instead of `secret_key`
+        :type schedule: `tuple`
         """
 
         if id_ > 4294967295 or id_ < 0:
@@ -91,8 +102,9 @@ class SmallMessage(object):
         self.body = body
 
         if self.message_type != SmallMessageType.PASSTHROUGH:
-            # Siphash requires a 16-byte input key.
-            mac_bits = self._generate_mac_bits(secret_key[:16])
+            if schedule is None and secret_key is None:
+                raise ValueError("secret_key or schedule is required")
+            mac_bits = self._generate_mac_bits(secret_key, schedule=schedule)
 
             # LSB 6 bits = 0x3F
             compressed_id = self.id_ & 0x3F
@@ -117,6 +129,8 @@ class SmallMessage(object):
 
         assert len(bits) == 28
         self.compressed_message_bits = bits
+        # Computed on first obscured call to `to_keycode`; messages are immutable
+        self._obscured_message_bits = None
 
     def __str__(self):
         return self.to_keycode(prefix="1", separator=" ", group_len=3, obscured=True)
@@ -204,7 +218,9 @@ class SmallMessage(object):
         output_message_bits = self.compressed_message_bits
         # Obscure (at bit level) if required
         if obscured:
-            output_message_bits = self.obscure(output_message_bits)
+            if self._obscured_message_bits is None:
+                self._obscured_message_bits = self.obscure(output_message_bits)
+            output_message_bits = self._obscured_message_bits
 
         keycode = self._bits_to_digits(output_message_bits)
 
@@ -212,25 +228,28 @@ class SmallMessage(object):
         keycode = prefix + "".join(map(lambda x: key_dict_confirmed[int(x)], keycode))
 
         keycode = separator.join(
-            keycode[i * group_len : (i + 1) * group_len]
-            for i in range(int(math.ceil(len(keycode) / float(group_len))))
+            [keycode[i : i + group_len] for i in range(0, len(keycode), group_len)]
         )
 
         return keycode
 
-    def _generate_mac_bits(self, secret_key):
+    def _generate_mac_bits(self, secret_key, schedule=None):
         """Compute the internal truncated MAC bits for this message.
 
-        Generate a MAC for this message using the specified secret key.  The
+        Generate a MAC for this message using the specified key.  The
         MAC is a 'truncated_MAC', generated from the 12 MSB from the result of
         a SipHash function applied to the message contents and secret key.  The
         returned result will be a 12-bit bitstream.
 
         MAC is generated using message ID, type code, and body byte.
 
-        :param secret_key: 16-byte secret key, e.g. b"\xff" * 16
+        :param secret_key: secret key, of which the first 16 bytes are used
         :type secret_key: `bytes`
-        :return: bitstream-packed form of the MAC generated using secret_key.
+        :param schedule: output of
+            :func:`nexus_keycode.protocols.utils.siphash_key_schedule`, used
+            instead of `secret_key`
+        :type schedule: `tuple`
+        :return: bitstream-packed form of the MAC generated using the key.
         :rtype: :class:`bitstring`
         """
 
@@ -247,8 +266,12 @@ class SmallMessage(object):
             ]
         )
 
-        function = siphash.SipHash_2_4(secret_key, structed)
-        check_value = function.hash() >> 52  # use 12 most-significant bits
+        if schedule is not None:
+            check = siphash_from_schedule(schedule).update(structed).hash()
+        else:
+            # Siphash requires a 16-byte input key.
+            check = digest_to_int(siphash24(secret_key[:16], structed))
+        check_value = check >> 52  # use 12 most-significant bits
 
         bits = bitstring.pack("uint:12", check_value)
 
@@ -274,12 +297,13 @@ class AddCreditSmallMessage(SmallMessage):
     MAX_ADD_CREDIT_DAYS = 405
     COARSE_DAYS_PER_INCREMENT_ID = 3
 
-    def __init__(self, id_, days, secret_key):
+    def __init__(self, id_, days, secret_key=None, schedule=None):
         super(AddCreditSmallMessage, self).__init__(
             id_=id_,
             message_type=SmallMessageType.ADD_CREDIT,
             body=AddCreditSmallMessage.generate_body(days),
             secret_key=secret_key,
+            schedule=schedule,
         )
 
     @classmethod
@@ -303,7 +327,7 @@ class PossibleMessageCollisionError(ValueError):
 
 
 class SetCreditSmallMessage(SmallMessage):
-    def __init__(self, id_, days, secret_key):
+    def __init__(self, id_, days, secret_key=None, schedule=None):
         if id_ & 0x3F == 63 and days == 1:
             # Prevent older small protocol test codes; which are interpreted
             # as a SET_CREDIT message with increment ID 0 and message ID 63.
@@ -319,6 +343,7 @@ class SetCreditSmallMessage(SmallMessage):
             message_type=SmallMessageType.SET_CREDIT,
             body=self.generate_body(days),
             secret_key=secret_key,
+            schedule=schedule,
         )
 
     @classmethod
@@ -354,7 +379,7 @@ class CustomCommandSmallMessageType(enum.Enum):
 
 class CustomCommandSmallMessage(SmallMessage):
     """Implemented as a SET_CREDIT message with specific increment_id values"""
-    def __init__(self, id_, type_, secret_key):
+    def __init__(self, id_, type_, secret_key=None, schedule=None):
         if (
             not isinstance(type_, CustomCommandSmallMessageType)
             or type_ not in CustomCommandSmallMessageType
@@ -365,7 +390,8 @@ class CustomCommandSmallMessage(SmallMessage):
             id_=id_,
             message_type=SmallMessageType.SET_CREDIT,
             body=self._generate_body(type_),
-            secret_key=secret_key
+            secret_key=secret_key,
+            schedule=schedule,
         )
 
     @staticmethod
@@ -383,12 +409,13 @@ class CustomCommandSmallMessage(SmallMessage):
 
 
 class UnlockSmallMessage(AddCreditSmallMessage):
-    def __init__(self, id_, secret_key):
+    def __init__(self, id_, secret_key=None, schedule=None):
         super(AddCreditSmallMessage, self).__init__(
             id_=id_,
             message_type=SmallMessageType.ADD_CREDIT,
             body=AddCreditSmallMessage.generate_body(self.UNLOCK_FLAG),
             secret_key=secret_key,
+            schedule=schedule,
         )
 
 
@@ -400,7 +427,7 @@ class MaintenanceSmallMessageType(enum.Enum):
 
 
 class MaintenanceSmallMessage(SmallMessage):
-    def __init__(self, type_, secret_key):
+    def __init__(self, type_, secret_key=None, schedule=None):
         if type_ not in [e for e in MaintenanceSmallMessageType]:
             raise ValueError("unsupported value for 'type_'")
 
@@ -414,6 +441,7 @@ class MaintenanceSmallMessage(SmallMessage):
             message_type=SmallMessageType.MAINTENANCE_TEST,
             body=body_bits,
             secret_key=secret_key,
+            schedule=schedule,
         )
 
 
@@ -496,13 +524,16 @@ class ExtendedSmallMessage(PassthroughSmallMessage):
         assert len(bits) == 4
 
         if type_ == ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG:
-            required_args = ['id_', 'days', 'secret_key']
+            required_args = ['id_', 'days']
             if not all(arg in kwargs for arg in required_args):
                 raise ValueError("Missing required kwargs {}".format(required_args))
 
             id_ = kwargs['id_']
             days = kwargs['days']
-            secret_key = kwargs['secret_key']
+            secret_key = kwargs.get('secret_key')
+            schedule = kwargs.get('schedule')
+            if secret_key is None and schedule is None:
+                raise ValueError("secret_key or schedule is required")
 
             # We might not be able to use the requested `id_` due to
             # MAC collisions, and may need to increment.
@@ -523,7 +554,8 @@ class ExtendedSmallMessage(PassthroughSmallMessage):
                     final_id,
                     type_,
                     body_bits,
-                    secret_key
+                    secret_key,
+                    schedule=schedule,
                 )
                 if auth is None:
                     logger.info("Unable to use id %s due to collision.", final_id)
@@ -540,10 +572,9 @@ class ExtendedSmallMessage(PassthroughSmallMessage):
                 id_ + self.EXTENDED_SMALL_FIRMWARE_RECEIPT_WINDOW_IDS_ABOVE
             )
 
-            body_and_mac = bitstring.pack(
-                ["bits:10=body", "uint:12=auth"],
-                body=body_bits,
-                auth=auth
+            # 10-bit body followed by 12-bit auth
+            body_and_mac = bitstring.Bits(
+                uint=(body_bits.uint << 12) | auth, length=22
             )
 
             self.final_message_id = final_id
@@ -558,35 +589,59 @@ class ExtendedSmallMessage(PassthroughSmallMessage):
         return super(ExtendedSmallMessage, self).__init__(bits=bits)
 
     @staticmethod
-    def _compute_auth(full_id, type_, body, secret_key):
-        # type: (int, ExtendedSmallMessageType, bitstring.Bits, bytes) -> int
+    def _compute_auth(full_id, type_, body, secret_key, schedule=None):
+        # type: (int, ExtendedSmallMessageType, bitstring.Bits, bytes, Any) -> int
+        return ExtendedSmallMessage._compute_auths(
+            [full_id], type_, body, secret_key, schedule=schedule
+        )[0]
 
-        packed_mac_inputs = bitstring.pack(
-            [
-                "uintle:32=full_id",
-                "uintle:8=extended_type_code",
-                "uintle:16=body_for_auth",  # 10 bits, left is 0-padded
-            ],
-            full_id=full_id,
-            extended_type_code=type_.value[0],
-            body_for_auth=body.uint
-        )
-        mac_input_bytes = packed_mac_inputs.tobytes()
-        assert len(mac_input_bytes) == 7
+    @staticmethod
+    def _compute_auths(
+        full_ids,  # type: List[int]
+        type_,  # type: ExtendedSmallMessageType
+        body,  # type: bitstring.Bits
+        secret_key,  # type: Optional[bytes]
+        schedule=None,  # type: Any
+    ):
+        # type: (...) -> List[int]
+        # Auth values for the same type/body under each of `full_ids`, using
+        # `schedule` (from `siphash_key_schedule`) instead of `secret_key`
+        # when it is given.
+
+        # struct { uint32_t full_id; uint8_t extended_type_code;
+        #          uint16_t body_for_auth; } (LE), body 10 bits, left 0-padded
+        type_code = type_.value[0]
+        body_for_auth = body.uint
+        mac_inputs = [
+            _EXTENDED_MAC_INPUT_STRUCT.pack(full_id, type_code, body_for_auth)
+            for full_id in full_ids
+        ]
         # 12 MSB bits are MAC/auth
-        return siphash.SipHash_2_4(secret_key, mac_input_bytes).hash() >> 52
+        if schedule is None:
+            digests = siphash24_batch(secret_key, mac_inputs)
+        else:
+            digests = [
+                siphash_from_schedule(schedule).update(mac_input).digest()
+                for mac_input in mac_inputs
+            ]
+        return [digest_to_int(digest) >> 52 for digest in digests]
 
     @classmethod
-    def compute_auth_with_no_collisions(cls, requested_id, type_, body, secret_key):
-        # type: (int, ExtendedSmallMessageType, bitstring.Bits, bytes) -> Optional[int]
+    def compute_auth_with_no_collisions(
+        cls,
+        requested_id,  # type: int
+        type_,  # type: ExtendedSmallMessageType
+        body,  # type: bitstring.Bits
+        secret_key,  # type: Optional[bytes]
+        schedule=None,  # type: Any
+    ):
+        # type: (...) -> Optional[int]
         # Will return None if there is a possible collision for the requested
         # ID, otherwise will return the auth value for the requested ID.
 
         # The message contains a truncated ID (2 bits) dividing the window by 4
         SUBWINDOW_STEP_INTERVAL = 2 ** type_.value[1]
 
-        candidate_mac = cls._compute_auth(requested_id, type_, body, secret_key)
-
         # {auth: msg_id}
         min_window_id = max(
             requested_id - cls.EXTENDED_SMALL_FIRMWARE_RECEIPT_WINDOW_IDS_BELOW,
@@ -598,18 +653,21 @@ class ExtendedSmallMessage(PassthroughSmallMessage):
             65535,
         )
 
-        for i in range(min_window_id, max_window_id + 1):
-            # Only check for collisions on IDs that have the same
-            # 2-LSB transmitted message ID bits
-            if (requested_id - i) % SUBWINDOW_STEP_INTERVAL != 0:
-                continue
-
-            # Don't recompute the candidate MAC
-            elif requested_id == i:
-                continue
-
-            auth = cls._compute_auth(i, type_, body, secret_key)
+        # Only check for collisions on IDs that have the same
+        # 2-LSB transmitted message ID bits (excluding the requested ID).
+        window_ids = [
+            i
+            for i in range(min_window_id, max_window_id + 1)
+            if i != requested_id and (requested_id - i) % SUBWINDOW_STEP_INTERVAL == 0
+        ]
+
+        # All MACs in the window share a key and body; compute them together
+        auths = cls._compute_auths(
+            [requested_id] + window_ids, type_, body, secret_key, schedule=schedule
+        )
+        candidate_mac = auths[0]
 
+        for i, auth in zip(window_ids, auths[1:]):
             if auth == candidate_mac:
                 logger.info("Encountered collision at ID %s (Auth=%s)", i, auth)
                 return None
@@ -621,14 +679,11 @@ class ExtendedSmallMessage(PassthroughSmallMessage):
         # type: (int, int) -> bitstring.Bits
         set_credit_increment_id = SetCreditSmallMessage.generate_body(days)
 
-        body_bits = bitstring.pack(
-            ["uint:2=truncated_msg_id", "uintle:8=increment_id"],
-            # truncate to least-significant 2 bits of the full ID
-            truncated_msg_id=id_ & 0b11,
-            increment_id=set_credit_increment_id
-        )
+        # 2-bit truncated message ID (least-significant 2 bits of the full
+        # ID), followed by the 8-bit increment ID
+        body = ((id_ & 0b11) << 8) | set_credit_increment_id
 
-        return body_bits
+        return bitstring.Bits(uint=body, length=10)
 
 
 @enum.unique
@@ -1,9 +1,26 @@
 import math
+import struct
 import sys
 
 import bitstring
 import siphash
 
+try:
+    # Optional C implementation of SipHash-2-4; see `siphash24`.
+    from csiphash import siphash24 as _csiphash24
+except ImportError:
+    _csiphash24 = None
+
+_UINT32_LE = struct.Struct("<I")
+_UINT64_LE = struct.Struct("<Q")
+
+# Key used by `pseudorandom_bits`; arbitrary, but affects output
+_PSEUDORANDOM_KEY = b"\x00" * 16
+
+# Number of distinct keys whose SipHash key schedule is kept in memory
+_SIPHASH_SCHEDULE_CACHE_MAXSIZE = 32
+_siphash_schedules = {}
+
 
 def int_to_bytes(int):
     py_ver = sys.version_info
@@ -21,6 +38,111 @@ def ints_to_bytes(ints):
         return bytes(ints)
 
 
+class _KeyedSipHash_2_4(siphash.SipHash_2_4):
+    """SipHash-2-4 hash object starting from an already-keyed state."""
+
+    def __init__(self, schedule):
+        # Mirrors the state set up by `SipHash_2_4.__init__` as of the
+        # `siphash==0.0.1` pin in setup.py; revisit if that pin changes.
+        self.v = schedule
+        self.s = b""
+        self.b = 0
+
+
+def siphash_key_schedule(secret_key):
+    """Return the SipHash-2-4 key schedule for `secret_key`.
+
+    The initial SipHash state depends only on the key, so it is memoized for
+    a small number of recently used keys. The schedule is an immutable value;
+    use :func:`siphash_from_schedule` to obtain a hash object to feed.
+
+    :param secret_key: 16-byte secret hash key
+    :type secret_key: `bytes`
+    :return: keyed SipHash state
+    :rtype: `tuple` of `int`
+    """
+    secret_key = bytes(secret_key)
+    schedule = _siphash_schedules.get(secret_key)
+    if schedule is None:
+        if len(_siphash_schedules) >= _SIPHASH_SCHEDULE_CACHE_MAXSIZE:
+            _siphash_schedules.clear()
+        schedule = tuple(siphash.SipHash_2_4(secret_key).v)
+        _siphash_schedules[secret_key] = schedule
+    return schedule
+
+
+def siphash_from_schedule(schedule):
+    """Return a new hash object keyed with `schedule`.
+
+    :param schedule: output of :func:`siphash_key_schedule`
+    :type schedule: `tuple` of `int`
+    :rtype: :class:`siphash.SipHash_2_4`
+    """
+    return _KeyedSipHash_2_4(schedule)
+
+
+def siphash24(secret_key, input_val):
+    """Compute the SipHash-2-4 digest of `input_val` under `secret_key`.
+
+    Uses the C implementation from `csiphash` when it is installed, and
+    falls back to the pure-Python `siphash` package otherwise. Both produce
+    identical output.
+
+    :param secret_key: 16-byte secret hash key
+    :type secret_key: `bytes`
+    :param input_val: data to hash
+    :type input_val: `bytes`
+    :return: 8-byte (little-endian) digest
+    :rtype: `bytes`
+    """
+    if not isinstance(input_val, (bytes, bytearray)):
+        raise TypeError("SipHash input must be bytes, not {}".format(type(input_val)))
+
+    if _csiphash24 is not None:
+        return _csiphash24(bytes(secret_key), bytes(input_val))
+    hasher = siphash_from_schedule(siphash_key_schedule(secret_key))
+    return hasher.update(input_val).digest()
+
+
+def siphash24_batch(secret_key, input_vals):
+    """Compute SipHash-2-4 digests of several inputs under one key.
+
+    Equivalent to `[siphash24(secret_key, v) for v in input_vals]`, but the
+    key is validated and its SipHash key schedule looked up only once.
+
+    :param secret_key: 16-byte secret hash key
+    :type secret_key: `bytes`
+    :param input_vals: data to hash
+    :type input_vals: iterable of `bytes`
+    :return: 8-byte (little-endian) digests, in input order
+    :rtype: `list` of `bytes`
+    """
+    input_vals = list(input_vals)
+    for input_val in input_vals:
+        if not isinstance(input_val, (bytes, bytearray)):
+            raise TypeError(
+                "SipHash input must be bytes, not {}".format(type(input_val))
+            )
+
+    if _csiphash24 is not None:
+        secret_key = bytes(secret_key)
+        return [_csiphash24(secret_key, bytes(v)) for v in input_vals]
+
+    schedule = siphash_key_schedule(secret_key)
+    return [siphash_from_schedule(schedule).update(v).digest() for v in input_vals]
+
+
+def digest_to_int(digest):
+    """Interpret an 8-byte SipHash digest as an unsigned integer.
+
+    Equivalent to `siphash.SipHash_2_4(...).hash()` for the same input.
+
+    :type digest: `bytes`
+    :rtype: `int`
+    """
+    return _UINT64_LE.unpack(digest)[0]
+
+
 def pseudorandom_bits(seed_bits, output_len):
     """Given some bits, compute arbitrarily many new pseudorandom bits.
 
@@ -47,10 +169,10 @@ def pseudorandom_bits(seed_bits, output_len):
     seed = (pad_bits + seed_bits).bytes
 
     # compute random bits
-    fixed_key = b"\x00" * 16  # arbitrary, but affects output
-
     def chunk(iteration):
-        hash_function = siphash.SipHash_2_4(fixed_key, int_to_bytes(iteration) + seed)
+        hash_function = siphash.SipHash_2_4(
+            _PSEUDORANDOM_KEY, int_to_bytes(iteration) + seed
+        )
 
         return bitstring.pack("uintle:64", hash_function.hash())
 
@@ -70,25 +192,29 @@ def full_obscure(digits, sign=1, obscured_digit_count=8):
     deterministically. This does not add any security to the sequence of
     digits, but hides visually-identifiable patterns/structure within
     the sequence."""
-    perturbed = list(map(int, list(digits)))
-
     assert len(digits) >= 6
     assert len(digits) == obscured_digit_count + 6
+    if obscured_digit_count > 8:
+        # only 8 pseudorandom bytes are generated per sequence
+        raise ValueError(
+            "At most 8 digits can be obscured, not {}".format(obscured_digit_count)
+        )
 
     # MAC digits are last 6 of perturbed, use uint32_t value as seed
-    packed_check = bitstring.pack("uintle:32", int(digits[-6:]))
+    packed_check = _UINT32_LE.pack(int(digits[-6:]))
 
     # [0, 255] values; one for each body digit
-    # 8 body digits, 8 bytes (8 bits each), so 64 bits of output required
-    pr_bits = pseudorandom_bits(packed_check, 64)
+    # 8 body digits, 8 bytes (8 bits each), so 64 bits of output required.
+    # Equivalent to `pseudorandom_bits(packed_check, 64).bytes`: the seed is
+    # byte-aligned, and the first 64 bits are the first (iteration 0) chunk.
+    pr_bytes = bytearray(siphash24(_PSEUDORANDOM_KEY, b"\x00" + packed_check))
 
-    for (i, d) in enumerate(perturbed[:obscured_digit_count]):
-        # value [0, 255]
-        pr_value = pr_bits[i * 8 : (i * 8 + 8)].uint * sign
-        perturbed[i] += pr_value
-        perturbed[i] %= 10
+    perturbed = [
+        str((int(d) + pr_value * sign) % 10)
+        for (d, pr_value) in zip(digits[:obscured_digit_count], pr_bytes)
+    ]
 
-    return "".join(map(str, perturbed))
+    return "".join(perturbed) + digits[obscured_digit_count:]
 
 
 def full_deobscure(digits, obscured_digit_count=8):
@@ -102,5 +228,5 @@ def generate_mac(input_val, secret_key):
     :type secret_key: 'byte'
     """
     # Mask lower 32 bits of siphash then return the last 6 digits
-    function = siphash.SipHash_2_4(secret_key, input_val)
-    return u"{:06d}".format(function.hash() & 0xFFFFFFFF)[-6:]
+    check = digest_to_int(siphash24(secret_key, input_val))
+    return u"{:06d}".format((check & 0xFFFFFFFF) % 1000000)
@@ -1,19 +1,28 @@
 from unittest import TestCase
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import siphash
+
 import nexus_keycode.protocols.channel_origin_commands as protocol
+from nexus_keycode.protocols.utils import full_obscure
 
 
 class TestChannelOriginActions(TestCase):
 
-    def setUp(self):
-        self.controller_command_count = 15
+    @classmethod
+    def setUpClass(cls):
+        cls.controller_command_count = 15
         # equivalent to authority ID 0x0102, device ID 0x2948372A4
         # last 1 truncated digit of decimal device ID is '2'
-        self.accessory_nexus_id = 0x0102948372A4
-        self.controller_sym_key = b'\xfe' * 8 + b'\xa2' * 8
-        self.controller_nexus_id = 0x120003827145  # '5' truncated
-        self.accessory_sym_key = b'\xc4\xb8@H\xcf\x04$\xa2]\xc5\xe9\xd3\xf0g@6'
-        self.accessory_command_count = 312
+        cls.accessory_nexus_id = 0x0102948372A4
+        cls.controller_sym_key = b'\xfe' * 8 + b'\xa2' * 8
+        cls.controller_nexus_id = 0x120003827145  # '5' truncated
+        cls.accessory_sym_key = b'\xc4\xb8@H\xcf\x04$\xa2]\xc5\xe9\xd3\xf0g@6'
+        cls.accessory_command_count = 312
 
     def test_unlink_all_accessories_builder__ok(self):
         token = (
@@ -48,12 +57,14 @@ class TestChannelOriginActions(TestCase):
 
 
 class TestChannelOriginCommandToken(TestCase):
-    atoken = protocol.ChannelOriginCommandToken(
-        type_=protocol.OriginCommandType.UNLINK_ACCESSORY,  # 2
-        body='12',
-        auth='554433',
-        controller_command_count=45321  # arbitrary here
-    )
+    @classmethod
+    def setUpClass(cls):
+        cls.atoken = protocol.ChannelOriginCommandToken(
+            type_=protocol.OriginCommandType.UNLINK_ACCESSORY,  # 2
+            body='12',
+            auth='554433',
+            controller_command_count=45321  # arbitrary here
+        )
 
     def test_str__simple_token__expected_value_returned(self):
         # '212' obscured to '222'
@@ -72,6 +83,26 @@ class TestChannelOriginCommandToken(TestCase):
         # '212' obscured to '222'
         self.assertEqual('222554433', self.atoken.to_digits())
 
+    def test_to_digits__repeated_calls__obscured_digits_reused(self):
+        token = protocol.ChannelOriginCommandToken(
+            type_=protocol.OriginCommandType.UNLINK_ACCESSORY,
+            body='12',
+            auth='554433',
+            controller_command_count=45321
+        )
+
+        with mock.patch.object(
+            protocol, 'full_obscure', wraps=full_obscure
+        ) as obscure:
+            self.assertEqual('222554433', token.to_digits())
+            self.assertEqual('222554433', token.to_digits())
+            self.assertEqual('222554433', str(token))
+
+        self.assertEqual(1, obscure.call_count)
+
+        # unobscured digits are not cached
+        self.assertEqual('212554433', token.to_digits(obscured=False))
+
     def test_init__invalid_type__raises(self):
         self.assertRaises(
             TypeError,
@@ -83,9 +114,10 @@ class TestChannelOriginCommandToken(TestCase):
 
 
 class TestGenericControllerActionToken(TestCase):
-    def setUp(self):
-        self.controller_command_count = 15
-        self.controller_sym_key = b'\xfe' * 8 + b'\xa2' * 8
+    @classmethod
+    def setUpClass(cls):
+        cls.controller_command_count = 15
+        cls.controller_sym_key = b'\xfe' * 8 + b'\xa2' * 8
 
     def test_unlink_all_accessories__ok(self):
         token = (
@@ -107,6 +139,20 @@ class TestGenericControllerActionToken(TestCase):
         # Origin authentication for this command
         self.assertEqual(token.auth, '018783')
 
+    def test_init__siphash_object_or_digest_auth__same_auth_digits(self):
+        mac_inputs = b'\x0f\x00\x00\x00' + b'\x00' + b'\x00\x00\x00\x00'
+        auth = siphash.SipHash_2_4(self.controller_sym_key, mac_inputs)
+
+        from_object = protocol.GenericControllerActionToken(
+            None, '00', auth, self.controller_command_count
+        )
+        from_digest = protocol.GenericControllerActionToken(
+            None, '00', auth.digest(), self.controller_command_count
+        )
+
+        self.assertEqual(from_object.auth, '018783')
+        self.assertEqual(from_digest.auth, '018783')
+
 
 class TestSpecificLinkedAccessoryToken(TestCase):
     def setUp(self):
@@ -1,9 +1,24 @@
 from unittest import TestCase
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 import nexus_keycode.protocols.full as protocol
 from nexus_keycode.protocols.channel_origin_commands import ChannelOriginAction
+from nexus_keycode.protocols.utils import full_obscure, siphash_key_schedule
 
 
 class TestBaseFullMessage(TestCase):
+    # (plain digits, obscured digits)
+    _OBSCURE_CASES = (
+        ("12345678901250", "57458927901250"),
+        ("12345678901241", "05094833901241"),
+        ("00000000524232", "57396884524232"),
+        ("00000000445755", "03605158445755"),
+    )
+
     amessage = protocol.BaseFullMessage(
         full_id=1223,  # LSB 6 Message ID = Dec 7
         message_type=protocol.FullMessageType.ADD_CREDIT,
@@ -52,41 +67,18 @@ class TestBaseFullMessage(TestCase):
         self.assertIn("is_factory", repred)
 
     def test_obscure__spec_values__ok(self):
-        def assert_obscure_ok(message, output):
-            self.assertEqual(protocol.BaseFullMessage.obscure(message), output)
-
-        cases = [
-            ["12345678901250", "57458927901250"],
-            ["12345678901241", "05094833901241"],
-            ["00000000524232", "57396884524232"],
-            ["00000000445755", "03605158445755"],
-        ]
-
-        for case in cases:
-            assert_obscure_ok(*case)
+        for (plain, obscured) in self._OBSCURE_CASES:
+            self.assertEqual(
+                protocol.BaseFullMessage.obscure(plain), obscured, msg=plain
+            )
 
     def test_deobscure__spec_values__ok(self):
-        def assert_deobscure_ok(message, output):
-            self.assertEqual(protocol.BaseFullMessage.deobscure(message), output)
-
-        cases = [
-            ["57458927901250", "12345678901250"],
-            ["05094833901241", "12345678901241"],
-            ["57396884524232", "00000000524232"],
-            ["03605158445755", "00000000445755"],
-        ]
-
-        for case in cases:
-            assert_deobscure_ok(*case)
-
-    def test_to_keycode__various_cases__output_correct(self):
-        def assert_keycode_ok(message, prefix, suffix, sep, grlen, expected):
-            generated = message.to_keycode(
-                prefix=prefix, suffix=suffix, separator=sep, group_len=grlen
+        for (plain, obscured) in self._OBSCURE_CASES:
+            self.assertEqual(
+                protocol.BaseFullMessage.deobscure(obscured), plain, msg=obscured
             )
 
-            self.assertEqual(generated, expected)
-
+    def test_to_keycode__various_cases__output_correct(self):
         cases = [
             [self.amessage, "", "", "", 3, "88519055663904"],
             [self.amessage, "*", "#", "-", 3, "*885-190-556-639-04#"],
@@ -96,8 +88,41 @@ class TestBaseFullMessage(TestCase):
             [self.fmessage, "*", "#", "-", 2, "*40-64-98-3#"],
         ]
 
-        for case in cases:
-            assert_keycode_ok(*case)
+        # `subTest` is unavailable on Python 2.7; tag each case via `msg`
+        for i, (msg, pre, suf, sep, grlen, expected) in enumerate(cases):
+            self.assertEqual(
+                msg.to_keycode(prefix=pre, suffix=suf, separator=sep, group_len=grlen),
+                expected,
+                msg="case {}".format(i),
+            )
+
+    def test_to_keycode__repeated_calls__obscured_digits_reused(self):
+        message = protocol.BaseFullMessage(
+            full_id=1223,
+            message_type=protocol.FullMessageType.ADD_CREDIT,
+            body="00993",
+            secret_key=b"\xab" * 16,
+            is_factory=False,
+        )
+
+        with mock.patch.object(
+            protocol, "full_obscure", wraps=full_obscure
+        ) as obscure:
+            self.assertEqual("*885 190 556 639 04#", message.to_keycode())
+            self.assertEqual(
+                "*885-190-556-639-04#", message.to_keycode(separator="-")
+            )
+            self.assertEqual(
+                "*8851 9055 6639 04#", message.to_keycode(group_len=4)
+            )
+            self.assertEqual("*885 190 556 639 04#", message.to_keycode())
+
+        self.assertEqual(1, obscure.call_count)
+
+        # unobscured rendering does not use the cached obscured digits
+        self.assertEqual(
+            "*007 009 936 639 04#", message.to_keycode(obscured=False)
+        )
 
     def test_to_keycode__obscuring_forced__output_matches(self):
         self.assertEqual(
@@ -115,8 +140,10 @@ class TestBaseFullMessage(TestCase):
 
 
 class TestFullMessage(TestCase):
-    def setUp(self):
-        self.secret_key = b"\xc4\xb8@H\xcf\x04$\xa2]\xc5\xe9\xd3\xf0g@6"
+    @classmethod
+    def setUpClass(cls):
+        cls.secret_key = b"\xc4\xb8@H\xcf\x04$\xa2]\xc5\xe9\xd3\xf0g@6"
+        cls._schedule = siphash_key_schedule(cls.secret_key)
 
     def test_add_credit__ok(self):
         msg = protocol.FullMessage.add_credit(42, 24 * 7, self.secret_key)
@@ -134,6 +161,20 @@ class TestFullMessage(TestCase):
         self.assertEqual(keycode[-6:], str(msg)[-6:])
         self.assertEqual("*186 261 012 193 03#", keycode)
 
+    def test_add_credit__with_schedule__ok(self):
+        msg = protocol.FullMessage.add_credit(42, 24 * 7, schedule=self._schedule)
+
+        self.assertEqual(msg.header, "042")
+        self.assertEqual(msg.body, "00168")
+        self.assertEqual("*186 261 012 193 03#", msg.to_keycode())
+
+        # schedule is not consumed by building a message
+        msg = protocol.FullMessage.add_credit(42, 24 * 7, schedule=self._schedule)
+        self.assertEqual("*186 261 012 193 03#", msg.to_keycode())
+
+    def test_add_credit__without_key_or_schedule__raises(self):
+        self.assertRaises(ValueError, protocol.FullMessage.add_credit, 42, 24 * 7)
+
     def test_add_credit__with_suffix_prefix__ok(self):
         msg = protocol.FullMessage.add_credit(42, 24 * 7, self.secret_key)
         prefix = "*"
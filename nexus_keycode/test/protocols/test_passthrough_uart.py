@@ -4,14 +4,26 @@ import nexus_keycode.protocols.passthrough_uart as uart
 
 
 class TestPassthroughUart(TestCase):
+    # ('base key' the UART security key is derived from, UART security key)
+    CASES = [
+        (
+            b"\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\x0c\x0d\x0e\x0f",
+            b"\x38\x79\x2f\xfc\x24\x1c\x2b\xc7\xc8\xcb\xf6\x24\x59\x3b\x57\x63",
+        ),
+        (
+            b"\x01" * 14 + b"\x43\x51",
+            b"\x12\xe4\x87\x62\x5c\x6b\x88\xf4\x1e\xe4\x0b\x16\xb4\xc9\x84\xf2",
+        ),
+    ]
+
     def test_passthrough_uart__expected_value_returned(self):
-        """ Test standard input into passthrough_uart and check
-            output"""
-        # 'input_bytes' is actually the 'base key' we are deriving
-        # the uart security key from
-        input_bytes = b"\x01" * 14 + b"\x43\x51"
-        uart_security_key = (
-            b"\x12\xe4\x87\x62\x5c\x6b\x88\xf4\x1e\xe4\x0b\x16\xb4\xc9\x84\xf2"
+        """ Test standard inputs into passthrough_uart and check
+            outputs"""
+        for input_bytes, uart_security_key in self.CASES:
+            result = uart.compute_uart_security_key(input_bytes)
+            self.assertEqual(result, uart_security_key, msg=repr(input_bytes))
+
+    def test_passthrough_uart__text_input__raises(self):
+        self.assertRaises(
+            TypeError, uart.compute_uart_security_key, u"\x01" * 14 + u"\x43\x51"
         )
-        result = uart.compute_uart_security_key(input_bytes)
-        self.assertEqual(result, uart_security_key)
@@ -12,59 +12,71 @@ from nexus_keycode.protocols.small import (
     SetCreditSmallMessage,
     UnlockSmallMessage,
 )
+from nexus_keycode.protocols.utils import siphash_key_schedule
 
 
 class TestREADME(TestCase):
     SECRET_KEY = b"\xde\xad\xbe\xef" * 4
 
-    def test_add_credit__full__ok(self):
-        message = FullMessage.add_credit(
-            id_=42, hours=24 * 7, secret_key=self.SECRET_KEY
-        )
-        self.assertEqual("*599 791 493 194 43#", message.to_keycode())
+    # (constructor, kwargs, keycode documented in README)
+    CASES = [
+        (
+            FullMessage.add_credit,
+            dict(id_=42, hours=24 * 7, secret_key=SECRET_KEY),
+            "*599 791 493 194 43#",
+        ),
+        (
+            FullMessage.set_credit,
+            dict(id_=43, hours=24 * 10, secret_key=SECRET_KEY),
+            "*682 070 357 093 12#",
+        ),
+        (
+            FullMessage.unlock,
+            dict(id_=44, secret_key=SECRET_KEY),
+            "*578 396 697 305 45#",
+        ),
+        (
+            FullMessage.wipe_state,
+            dict(
+                id_=45, flags=FullMessageWipeFlags.WIPE_IDS_ALL, secret_key=SECRET_KEY
+            ),
+            "*356 107 776 307 38#",
+        ),
+        (FactoryFullMessage.oqc_test, dict(), "*500 060 694 509#"),
+        (FactoryFullMessage.allow_test, dict(), "*406 498 3#"),
+        (FactoryFullMessage.display_payg_id, dict(), "*634 776 5#"),
+        (
+            AddCreditSmallMessage,
+            dict(id_=42, days=7, secret_key=SECRET_KEY),
+            "135 242 422 455 244",
+        ),
+        (
+            SetCreditSmallMessage,
+            dict(id_=44, days=10, secret_key=SECRET_KEY),
+            "142 522 332 234 533",
+        ),
+        (
+            UnlockSmallMessage,
+            dict(id_=45, secret_key=SECRET_KEY),
+            "152 323 254 454 322",
+        ),
+        (
+            MaintenanceSmallMessage,
+            dict(type_=MaintenanceSmallMessageType.WIPE_IDS_ALL, secret_key=SECRET_KEY),
+            "122 324 235 545 545",
+        ),
+    ]
 
-    def test_set_credit__full__ok(self):
-        message = FullMessage.set_credit(
-            id_=43, hours=24 * 10, secret_key=self.SECRET_KEY
-        )
-        self.assertEqual("*682 070 357 093 12#", message.to_keycode())
+    def test_all_golden_keycodes(self):
+        results = [fn(**kwargs).to_keycode() for fn, kwargs, _ in self.CASES]
+        self.assertListEqual(results, [golden for _, _, golden in self.CASES])
 
-    def test_unlock__full__ok(self):
-        message = FullMessage.unlock(id_=44, secret_key=self.SECRET_KEY)
-        self.assertEqual("*578 396 697 305 45#", message.to_keycode())
+    def test_all_golden_keycodes__key_schedule__same_keycodes(self):
+        schedule = siphash_key_schedule(self.SECRET_KEY)
+        results = []
+        for fn, kwargs, _ in self.CASES:
+            if "secret_key" in kwargs:
+                kwargs = dict(kwargs, secret_key=None, schedule=schedule)
+            results.append(fn(**kwargs).to_keycode())
 
-    def test_wipe__full__ok(self):
-        message = FullMessage.wipe_state(
-            id_=45, flags=FullMessageWipeFlags.WIPE_IDS_ALL, secret_key=self.SECRET_KEY
-        )
-        self.assertEqual("*356 107 776 307 38#", message.to_keycode())
-
-    def test_oqc_test__full__ok(self):
-        message = FactoryFullMessage.oqc_test()
-        self.assertEqual("*500 060 694 509#", message.to_keycode())
-
-    def test_factory_test__full__ok(self):
-        message = FactoryFullMessage.allow_test()
-        self.assertEqual("*406 498 3#", message.to_keycode())
-
-    def test_display_payg_id__full__ok(self):
-        message = FactoryFullMessage.display_payg_id()
-        self.assertEqual("*634 776 5#", message.to_keycode())
-
-    def test_add_credit__small__ok(self):
-        message = AddCreditSmallMessage(id_=42, days=7, secret_key=self.SECRET_KEY)
-        self.assertEqual("135 242 422 455 244", message.to_keycode())
-
-    def test_set_credit__small__ok(self):
-        message = SetCreditSmallMessage(id_=44, days=10, secret_key=self.SECRET_KEY)
-        self.assertEqual("142 522 332 234 533", message.to_keycode())
-
-    def test_unlock__small__ok(self):
-        message = UnlockSmallMessage(id_=45, secret_key=self.SECRET_KEY)
-        self.assertEqual("152 323 254 454 322", message.to_keycode())
-
-    def test_wipe__small__ok(self):
-        message = MaintenanceSmallMessage(
-            type_=MaintenanceSmallMessageType.WIPE_IDS_ALL, secret_key=self.SECRET_KEY
-        )
-        self.assertEqual("122 324 235 545 545", message.to_keycode())
+        self.assertListEqual(results, [golden for _, _, golden in self.CASES])
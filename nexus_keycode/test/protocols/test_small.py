@@ -1,291 +1,399 @@
 from unittest import TestCase
 
-import bitstring
-import nexus_keycode.protocols.small as protocol
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from bitstring import Bits
+
+from nexus_keycode.protocols.small import (
+    AddCreditSmallMessage,
+    CustomCommandSmallMessage,
+    CustomCommandSmallMessageType,
+    ExtendedSmallMessage,
+    ExtendedSmallMessageIdInvalidError,
+    ExtendedSmallMessageType,
+    MaintenanceSmallMessage,
+    MaintenanceSmallMessageType,
+    PassthroughSmallMessage,
+    SetCreditSmallMessage,
+    SmallMessage,
+    SmallMessageType,
+    UnlockSmallMessage,
+)
+# Aliased so they are not mistaken for (or shadowed by) test cases
+from nexus_keycode.protocols.small import TestSmallMessage as _TestSmallMessage
+from nexus_keycode.protocols.small import TestSmallMessageType as _TestSmallMessageType
+from nexus_keycode.protocols.utils import siphash_key_schedule
+
+_KEY_AB = b"\xab" * 16
+_KEY_FF = b"\xff" * 16
+_KEY_FB00A598 = b"\xfb\x00\xa5\x98" * 4
+_KEY_FEA2 = b"\xfe" * 8 + b"\xa2" * 8
+
+# SET_CREDIT_WIPE_RESTRICTED_FLAG scenarios (embedded end-to-end test vectors),
+# stored as parallel columns; the Nth entry of each describes one scenario.
+# Keycodes are generated with secret key `_KEY_FEA2`.
+_WIPE_IDS = (0, 5, 22, 60, 90, 120)
+_WIPE_DAYS = (915, 1, 0, SmallMessage.UNLOCK_FLAG, 365, 30)
+_WIPE_BODIES = (
+    0b0011101101,
+    0b0100000000,
+    0b1011111110,
+    0b0011111111,
+    0b1010110100,
+    0b0000011101,
+)
+_WIPE_KEYCODES = (
+    "155 222 234 423 344",
+    "144 254 333 543 553",
+    "133 432 252 333 332",
+    "123 245 222 535 225",
+    "132 223 555 342 554",
+    "143 525 243 432 322",
+)
 
 
 class TestTestSmallMessage(TestCase):
-    def test_init__invalid_type__raises(self):
-        self.assertRaises(ValueError, protocol.TestSmallMessage, type_=20)
+    # (type_, first 16 compressed message bits, keycode)
+    _CASES = (
+        (
+            _TestSmallMessageType.SHORT_TEST,
+            0b0000001100000000,
+            "143 253 222 433 244",
+        ),
+        (
+            _TestSmallMessageType.OQC_TEST,
+            0b0000001100000001,
+            "124 233 243 522 424",
+        ),
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        cls._msgs = {
+            type_: _TestSmallMessage(type_=type_) for type_, _, _ in cls._CASES
+        }
 
-    def test_compressed_message_bits__short_test_type__output_correct(self):
-        message = protocol.TestSmallMessage(
-            type_=protocol.TestSmallMessageType.SHORT_TEST
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000001100000000")
-        self.assertEqual("143 253 222 433 244", message.to_keycode())
+    def test_init__invalid_type__raises(self):
+        self.assertRaises(ValueError, _TestSmallMessage, type_=20)
 
-    def test_compressed_message_bits__oqc_test_type__output_correct(self):
-        message = protocol.TestSmallMessage(
-            type_=protocol.TestSmallMessageType.OQC_TEST
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000001100000001")
-        self.assertEqual("124 233 243 522 424", message.to_keycode())
+    def test_compressed_message_bits__various_types__output_correct(self):
+        for type_, expected_bits, expected_keycode in self._CASES:
+            message = self._msgs[type_]
+            self.assertEqual(
+                message.compressed_message_bits[0:16].uint, expected_bits, msg=type_
+            )
+            self.assertEqual(expected_keycode, message.to_keycode(), msg=type_)
 
 
 class TestMaintenanceSmallMessage(TestCase):
+    # (type_, first 16 compressed message bits, keycode)
+    _CASES = (
+        (
+            MaintenanceSmallMessageType.WIPE_STATE_0,
+            0b0000001110000000,
+            "122 553 254 245 542",
+        ),
+        (
+            MaintenanceSmallMessageType.WIPE_STATE_1,
+            0b0000001110000001,
+            "154 434 534 522 522",
+        ),
+        (
+            MaintenanceSmallMessageType.WIPE_IDS_ALL,
+            0b0000001110000010,
+            "153 224 344 342 322",
+        ),
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        cls._msgs = {
+            type_: MaintenanceSmallMessage(type_=type_, secret_key=_KEY_AB)
+            for type_, _, _ in cls._CASES
+        }
+
     def test_init__invalid_type__raises(self):
         self.assertRaises(
             ValueError,
-            protocol.MaintenanceSmallMessage,
+            MaintenanceSmallMessage,
             type_=3,
-            secret_key=b"\xab" * 16,
+            secret_key=_KEY_AB,
         )
 
-    def test_compressed_message_bits__wipe_state_0_type__output_correct(self):
-        message = protocol.MaintenanceSmallMessage(
-            type_=protocol.MaintenanceSmallMessageType.WIPE_STATE_0,
-            secret_key=b"\xab" * 16,
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000001110000000")
-        self.assertEqual("122 553 254 245 542", message.to_keycode())
-
-    def test_compressed_message_bits__wipe_state_1_type__output_correct(self):
-        message = protocol.MaintenanceSmallMessage(
-            type_=protocol.MaintenanceSmallMessageType.WIPE_STATE_1,
-            secret_key=b"\xab" * 16,
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000001110000001")
-        self.assertEqual("154 434 534 522 522", message.to_keycode())
-
-    def test_compressed_message_bits__wipe_ids_all_type__output_correct(self):
-        message = protocol.MaintenanceSmallMessage(
-            type_=protocol.MaintenanceSmallMessageType.WIPE_IDS_ALL,
-            secret_key=b"\xab" * 16,
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000001110000010")
-        self.assertEqual("153 224 344 342 322", message.to_keycode())
+    def test_compressed_message_bits__various_types__output_correct(self):
+        for type_, expected_bits, expected_keycode in self._CASES:
+            message = self._msgs[type_]
+            self.assertEqual(
+                message.compressed_message_bits[0:16].uint, expected_bits, msg=type_
+            )
+            self.assertEqual(expected_keycode, message.to_keycode(), msg=type_)
 
 
 class TestAddCreditSmallMessage(TestCase):
+    # (id_, days, first 16 compressed message bits, keycode)
+    _CASES = (
+        (0, 1, 0b0000000000000000, "133 232 343 432 255"),
+        (1, 180, 0b0000010010110011, "122 425 324 553 555"),
+        (10, 181, 0b0010100010110100, "132 353 543 455 243"),
+        (125, 405, 0b1111010011111110, "132 335 454 524 233"),
+        # large message ID
+        (65234, 405, 0b0100100011111110, "143 235 545 435 454"),
+        (
+            1,
+            SmallMessage.UNLOCK_FLAG,
+            0b0000010011111111,
+            "134 435 355 535 552",
+        ),
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        cls._msgs = {
+            (id_, days): AddCreditSmallMessage(
+                id_=id_, days=days, secret_key=_KEY_AB
+            )
+            for id_, days, _, _ in cls._CASES
+        }
+
     def test_init__invalid_too_large_id__raises(self):
         self.assertRaises(
             ValueError,
-            protocol.AddCreditSmallMessage,
+            AddCreditSmallMessage,
             id_=68719476721,
             days=1,
-            secret_key=b"\xab" * 16,
+            secret_key=_KEY_AB,
         )
 
     def test_init__negative_id__raises(self):
         self.assertRaises(
             ValueError,
-            protocol.AddCreditSmallMessage,
+            AddCreditSmallMessage,
             id_=-1,
             days=1,
-            secret_key=b"\xab" * 16,
+            secret_key=_KEY_AB,
         )
 
     def test_init__invalid_days__raises(self):
         self.assertRaises(
             ValueError,
-            protocol.AddCreditSmallMessage,
+            AddCreditSmallMessage,
             id_=0,
             days=406,
-            secret_key=b"\xab" * 16,
-        )
-
-    def test_compressed_message_bits__add_1_day_message__output_correct(self):
-        message = protocol.AddCreditSmallMessage(id_=0, days=1, secret_key=b"\xab" * 16)
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000000000000000")
-        self.assertEqual("133 232 343 432 255", message.to_keycode())
-
-    def test_compressed_message_bits__add_180_day__output_correct(self):
-        message = protocol.AddCreditSmallMessage(
-            id_=1, days=180, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000010010110011")
-        self.assertEqual("122 425 324 553 555", message.to_keycode())
-
-    def test_compressed_message_bits__add_181_day__output_correct(self):
-        message = protocol.AddCreditSmallMessage(
-            id_=10, days=181, secret_key=b"\xab" * 16
+            secret_key=_KEY_AB,
         )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0010100010110100")
-        self.assertEqual("132 353 543 455 243", message.to_keycode())
 
-    def test_compressed_message_bits__add_405_day__output_correct(self):
-        message = protocol.AddCreditSmallMessage(
-            id_=125, days=405, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "1111010011111110")
-        self.assertEqual("132 335 454 524 233", message.to_keycode())
-
-    def test_compressed_message_bits__large_message_id__output_correct(self):
-        message = protocol.AddCreditSmallMessage(
-            id_=65234, days=405, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0100100011111110")
-        self.assertEqual("143 235 545 435 454", message.to_keycode())
-
-    def test_compressed_message_bits__add_credit_unlock__output_correct(self):
-        message = protocol.AddCreditSmallMessage(
-            id_=1, days=protocol.SmallMessage.UNLOCK_FLAG, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000010011111111")
-        self.assertEqual("134 435 355 535 552", message.to_keycode())
+    def test_compressed_message_bits__various_messages__output_correct(self):
+        for id_, days, expected_bits, expected_keycode in self._CASES:
+            message = self._msgs[(id_, days)]
+            case = "id_={}, days={}".format(id_, days)
+            self.assertEqual(
+                message.compressed_message_bits[0:16].uint, expected_bits, msg=case
+            )
+            self.assertEqual(expected_keycode, message.to_keycode(), msg=case)
 
 
 class TestSetCreditSmallMessage(TestCase):
+    # (id_, days, first 16 compressed message bits (ID, type, body), keycode)
+    _CASES = (
+        (0, 1, 0b000000 << 10 | 0b10 << 8 | 0b00000000, "142 525 352 252 234"),
+        (1, 92, 0b000001 << 10 | 0b10 << 8 | 0b01011010, "124 445 543 325 325"),
+        (1, 960, 0b000001 << 10 | 0b10 << 8 | 0b11101111, "152 523 424 453 432"),
+        # lock
+        (1542, 0, 0b000110 << 10 | 0b10 << 8 | 0b11111110, "154 445 453 335 225"),
+        (
+            6573,
+            SmallMessage.UNLOCK_FLAG,
+            0b101101 << 10 | 0b10 << 8 | 0b11111111,
+            "143 534 323 324 344",
+        ),
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        cls._msgs = {
+            (id_, days): SetCreditSmallMessage(
+                id_=id_, days=days, secret_key=_KEY_AB
+            )
+            for id_, days, _, _ in cls._CASES
+        }
+
     def test_init__invalid_days__raises(self):
         self.assertRaises(
             ValueError,
-            protocol.SetCreditSmallMessage,
+            SetCreditSmallMessage,
             id_=0,
             days=961,  # 960 is set credit max
-            secret_key=b"\xab" * 16,
+            secret_key=_KEY_AB,
         )
 
-    def test_compressed_message_bits__set_1_day_message__output_correct(self):
-        message = protocol.SetCreditSmallMessage(id_=0, days=1, secret_key=b"\xab" * 16)
-        self.assertEqual(
-            message.compressed_message_bits[0:16].bin, "000000" + "10" + "00000000"
-        )
-        self.assertEqual("142 525 352 252 234", message.to_keycode())
-
-    def test_compressed_message_bits__set_92_day_message__output_correct(self):
-        message = protocol.SetCreditSmallMessage(
-            id_=1, days=92, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(
-            message.compressed_message_bits[0:16].bin, "000001" + "10" + "01011010"
-        )
-        self.assertEqual("124 445 543 325 325", message.to_keycode())
-
-    def test_compressed_message_bits__set_960_day_message__output_correct(self):
-        message = protocol.SetCreditSmallMessage(
-            id_=1, days=960, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(
-            message.compressed_message_bits[0:16].bin, "000001" + "10" + "11101111"
-        )
-        self.assertEqual("152 523 424 453 432", message.to_keycode())
-
-    def test_compressed_message_bits__set_lock_message__output_correct(self):
-        message = protocol.SetCreditSmallMessage(
-            id_=1542, days=0, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(
-            message.compressed_message_bits[0:16].bin, "000110" + "10" + "11111110"
-        )
-        self.assertEqual("154 445 453 335 225", message.to_keycode())
-
-    def test_compressed_message_bits__set_unlock_message__output_correct(self):
-        message = protocol.SetCreditSmallMessage(
-            id_=6573, days=protocol.SmallMessage.UNLOCK_FLAG, secret_key=b"\xab" * 16
-        )
-        self.assertEqual(
-            message.compressed_message_bits[0:16].bin, "101101" + "10" + "11111111"
-        )
-        self.assertEqual("143 534 323 324 344", message.to_keycode())
+    def test_compressed_message_bits__various_messages__output_correct(self):
+        for id_, days, expected_bits, expected_keycode in self._CASES:
+            message = self._msgs[(id_, days)]
+            case = "id_={}, days={}".format(id_, days)
+            self.assertEqual(
+                message.compressed_message_bits[0:16].uint, expected_bits, msg=case
+            )
+            self.assertEqual(expected_keycode, message.to_keycode(), msg=case)
 
 
 class TestCustomCommandSmallMessage(TestCase):
     def test_init__invalid_command_type__raises(self):
         with self.assertRaises(ValueError):
-            protocol.CustomCommandSmallMessage(
+            CustomCommandSmallMessage(
                 id_=63,
                 type_=220,
-                secret_key=b"\xab" * 16
+                secret_key=_KEY_AB
             )
 
     def test_generate_body__bad_increment_id__raises(self):
         # Double check that _generate_body is checking the ID value
         # Lower bound
         with self.assertRaises(ValueError):
-            protocol.CustomCommandSmallMessage._generate_body(type_=239)
+            CustomCommandSmallMessage._generate_body(type_=239)
 
         # Upper bound
         with self.assertRaises(ValueError):
-            protocol.CustomCommandSmallMessage._generate_body(type_=254)
+            CustomCommandSmallMessage._generate_body(type_=254)
 
     def test_init__valid_command_types__expected_value_returned(self):
-        message = protocol.CustomCommandSmallMessage(
+        message = CustomCommandSmallMessage(
             100,
-            protocol.CustomCommandSmallMessageType.WIPE_RESTRICTED_FLAG,
-            secret_key=b"\xab" * 16)
+            CustomCommandSmallMessageType.WIPE_RESTRICTED_FLAG,
+            secret_key=_KEY_AB)
 
         self.assertEqual("135 335 422 245 432", message.to_keycode())
 
 
 class TestUnlockSmallMessage(TestCase):
     def test_compressed_message_bits__unlock__output_correct(self):
-        message = protocol.UnlockSmallMessage(id_=1, secret_key=b"\xab" * 16)
-        self.assertEqual(message.compressed_message_bits[0:16].bin, "0000010011111111")
+        message = UnlockSmallMessage(id_=1, secret_key=_KEY_AB)
+        self.assertEqual(message.compressed_message_bits[0:16].uint, 0b0000010011111111)
         self.assertEqual("134 435 355 535 552", message.to_keycode())
 
 
 class TestPassthroughSmallMessage(TestCase):
+    _BITS_ALL1 = Bits(uint=(1 << 26) - 1, length=26)
+    _BITS_ALL0 = Bits(uint=0, length=26)
+    _BITS_ALT = Bits(uint=0b01010101010101010101010101, length=26)
+    # 10-long pattern
+    _BITS_PAT = Bits(uint=0b11100110101110011010111001, length=26)
+    _BITS_ALL1_27 = Bits(uint=(1 << 27) - 1, length=27)
+    _BITS_ALL1_25 = Bits(uint=(1 << 25) - 1, length=25)
+
     def test_compressed_message_bits__valid_length__output_correct(self):
         # All '1' bits
-        bits = bitstring.Bits(bin='0b11111111111111111111111111')
-        message = protocol.PassthroughSmallMessage(bits)
-        self.assertEqual(message.compressed_message_bits[0:28].bin, "1111110111111111111111111111")
+        bits = self._BITS_ALL1
+        message = PassthroughSmallMessage(bits)
+        self.assertEqual(message.compressed_message_bits.uint, 0b1111110111111111111111111111)
         self.assertEqual("152 544 435 555 555", message.to_keycode())
 
         # All '0' bits
-        bits = bitstring.Bits(bin='0b00000000000000000000000000')
-        message = protocol.PassthroughSmallMessage(bits)
-        self.assertEqual(message.compressed_message_bits[0:28].bin, "0000000100000000000000000000")
+        bits = self._BITS_ALL0
+        message = PassthroughSmallMessage(bits)
+        self.assertEqual(message.compressed_message_bits.uint, 0b0000000100000000000000000000)
         self.assertEqual("124 325 434 222 222", message.to_keycode())
 
         # alternating
-        bits = bitstring.Bits(bin='0b01010101010101010101010101')
-        message = protocol.PassthroughSmallMessage(bits)
-        self.assertEqual(message.compressed_message_bits[0:28].bin, "0101010101010101010101010101")
+        bits = self._BITS_ALT
+        message = PassthroughSmallMessage(bits)
+        self.assertEqual(message.compressed_message_bits.uint, 0b0101010101010101010101010101)
         self.assertEqual("132 423 253 333 333", message.to_keycode())
 
         # 10-long pattern
-        bits = bitstring.Bits(bin='0b11100110101110011010111001')
-        message = protocol.PassthroughSmallMessage(bits)
-        self.assertEqual(message.compressed_message_bits[0:28].bin, "1110010110101110011010111001")
+        bits = self._BITS_PAT
+        message = PassthroughSmallMessage(bits)
+        self.assertEqual(message.compressed_message_bits.uint, 0b1110010110101110011010111001)
         self.assertEqual("123 534 332 344 543", message.to_keycode())
 
     def test_compressed_message_bits__invalid_length__raises(self):
         # All '1' bits (27 bits)
-        bits = bitstring.Bits(bin='0b111111111111111111111111111')
+        bits = self._BITS_ALL1_27
         with self.assertRaises(ValueError):
-            protocol.PassthroughSmallMessage(bits)
+            PassthroughSmallMessage(bits)
 
         # All '1' bits (25 bits)
-        bits = bitstring.Bits(bin='0b1111111111111111111111111')
+        bits = self._BITS_ALL1_25
         with self.assertRaises(ValueError):
-            protocol.PassthroughSmallMessage(bits)
+            PassthroughSmallMessage(bits)
 
 
 class TestExtendedSmallMessage(TestCase):
+    # (id_, days) of each valid SET_CREDIT_WIPE_RESTRICTED_FLAG message below
+    _INPUTS = (
+        (102, 30),
+        (27, 51),
+        (834, 0),
+        (9, SmallMessage.UNLOCK_FLAG),
+        (4, 0),
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        cls._msgs = {
+            (id_, days): ExtendedSmallMessage(
+                ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+                id_=id_,
+                days=days,
+                secret_key=_KEY_AB,
+            )
+            for id_, days in cls._INPUTS
+        }
+
     def test_repr__simple_message__expected_snippets_present(self):
         repred = repr(
-            protocol.ExtendedSmallMessage(
-                protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-                id_=10, days=50, secret_key=b"\xff" * 16
+            ExtendedSmallMessage(
+                ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+                id_=10, days=50, secret_key=_KEY_FF
             )
         )
         self.assertIn("ExtendedSmallMessage", repred)
 
     def test_init__invalid_command_type__raises(self):
         with self.assertRaises(ValueError):
-            protocol.ExtendedSmallMessage(
+            ExtendedSmallMessage(
                 220,
                 id_=102,
                 days=30,
-                secret_key=b"\xab" * 16
+                secret_key=_KEY_AB
             )
 
-    def test_init__valid_message_types__expected_value_returned(self):
-        secret_key = b"\xab" * 16
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+    def test_init__key_schedule__same_messages(self):
+        schedule = siphash_key_schedule(_KEY_AB)
+        for (id_, days) in self._INPUTS:
+            message = ExtendedSmallMessage(
+                ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+                id_=id_,
+                days=days,
+                schedule=schedule,
+            )
+            self.assertEqual(
+                self._msgs[(id_, days)].to_keycode(),
+                message.to_keycode(),
+                msg=(id_, days),
+            )
+
+    def test_init__without_key_or_schedule__raises(self):
+        self.assertRaises(
+            ValueError,
+            ExtendedSmallMessage,
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
             id_=102,
             days=30,
-            secret_key=secret_key)
+        )
+
+    def test_init__valid_message_types__expected_value_returned(self):
+        secret_key = _KEY_AB
+        message = self._msgs[(102, 30)]
 
         body_bits = message.body
         # first bit = app ID
         self.assertEqual(1, body_bits[0:1].uint)
         # type code
         self.assertEqual(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
             body_bits[1:4].uint
         )
         # LSB 2 bits of message ID (0b10 for 102)
@@ -293,9 +401,9 @@ class TestExtendedSmallMessage(TestCase):
         # increment ID for days = 30
         self.assertEqual(29, body_bits[6:14].uint)
 
-        computed_auth = protocol.ExtendedSmallMessage._compute_auth(
+        computed_auth = ExtendedSmallMessage._compute_auth(
             102,
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
             body_bits[4:14],  # body of inner 'extended' message
             secret_key)
 
@@ -306,28 +414,24 @@ class TestExtendedSmallMessage(TestCase):
         self.assertEqual("132 223 222 552 244", message.to_keycode())
 
     def test_generate_set_credit_wipe_restricted__mac_collision__final_message_id_updated(self):
-        secret_key = b"\xab" * 16
+        secret_key = _KEY_AB
 
         # Expect collision at message ID 26, updated to 27
-        with self.assertRaises(protocol.ExtendedSmallMessageIdInvalidError):
-            protocol.ExtendedSmallMessage(
-                protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+        with self.assertRaises(ExtendedSmallMessageIdInvalidError):
+            ExtendedSmallMessage(
+                ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
                 id_=26,
                 days=51,
                 secret_key=secret_key
             )
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=27,
-            days=51,
-            secret_key=secret_key)
+        message = self._msgs[(27, 51)]
 
         self.assertEqual(27, message.final_message_id)
 
         body_bits = message.body
         self.assertEqual(1, body_bits[0:1].uint)
         self.assertEqual(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
             body_bits[1:4].uint
         )
         # LSB 2 bits of message ID (3 for 27)
@@ -336,9 +440,9 @@ class TestExtendedSmallMessage(TestCase):
         self.assertEqual(50, body_bits[6:14].uint)
 
         # manually verify auth field
-        computed_auth = protocol.ExtendedSmallMessage._compute_auth(
+        computed_auth = ExtendedSmallMessage._compute_auth(
             27,
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
             body_bits[4:14],  # body of inner 'extended' message
             secret_key)
 
@@ -347,25 +451,21 @@ class TestExtendedSmallMessage(TestCase):
         self.assertEqual("153 422 352 252 245", message.to_keycode())
 
         # Expect collision at message ID 833
-        with self.assertRaises(protocol.ExtendedSmallMessageIdInvalidError):
-            protocol.ExtendedSmallMessage(
-                protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+        with self.assertRaises(ExtendedSmallMessageIdInvalidError):
+            ExtendedSmallMessage(
+                ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
                 id_=833,
                 days=0,
                 secret_key=secret_key
             )
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=834,
-            days=0,
-            secret_key=secret_key)
+        message = self._msgs[(834, 0)]
 
         self.assertEqual(834, message.final_message_id)
 
         body_bits = message.body
         self.assertEqual(1, body_bits[0:1].uint)
         self.assertEqual(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
             body_bits[1:4].uint
         )
         # LSB 2 bits of message ID (0b10 for 834)
@@ -373,9 +473,9 @@ class TestExtendedSmallMessage(TestCase):
         # increment ID for days = 0
         self.assertEqual(254, body_bits[6:14].uint)
 
-        computed_auth = protocol.ExtendedSmallMessage._compute_auth(
+        computed_auth = ExtendedSmallMessage._compute_auth(
             834,
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
             body_bits[4:14],  # body of inner 'extended' message
             secret_key)
 
@@ -384,29 +484,25 @@ class TestExtendedSmallMessage(TestCase):
         self.assertEqual("134 225 533 544 333", message.to_keycode())
 
     def test_generate_set_credit_wipe_restricted__unlock_increment__expected_body(self):
-        secret_key = b"\xab" * 16
+        secret_key = _KEY_AB
 
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=9,
-            days=protocol.SmallMessage.UNLOCK_FLAG,
-            secret_key=secret_key)
+        message = self._msgs[(9, SmallMessage.UNLOCK_FLAG)]
 
         self.assertEqual(9, message.final_message_id)
 
         body_bits = message.body
         self.assertEqual(1, body_bits[0:1].uint)
         self.assertEqual(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
             body_bits[1:4].uint
         )
         self.assertEqual(1, body_bits[4:6].uint)
         # increment ID for days = UNLOCK
         self.assertEqual(255, body_bits[6:14].uint)
 
-        computed_auth = protocol.ExtendedSmallMessage._compute_auth(
+        computed_auth = ExtendedSmallMessage._compute_auth(
             9,
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
             body_bits[4:14],  # body of inner 'extended' message
             secret_key)
 
@@ -415,18 +511,14 @@ class TestExtendedSmallMessage(TestCase):
         self.assertEqual("153 435 425 322 453", message.to_keycode())
 
     def test_generate_set_credit_wipe_restricted__0_credit_increment__expected_body(self):
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=4,
-            days=0,
-            secret_key=b"\xab" * 16)
+        message = self._msgs[(4, 0)]
 
         self.assertEqual(4, message.final_message_id)
 
         body_bits = message.body
         self.assertEqual(1, body_bits[0:1].uint)
         self.assertEqual(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
+            ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG.value[0],
             body_bits[1:4].uint
         )
         self.assertEqual(0, body_bits[4:6].uint)
@@ -435,93 +527,69 @@ class TestExtendedSmallMessage(TestCase):
 
         self.assertEqual("144 435 244 232 344", message.to_keycode())
 
-    def test_generate_set_credit_wipe_restricted__bad_increment_id__raises(self):
-        # Double check that _generate_body is checking the ID value
-        # Lower bound
-        with self.assertRaises(ValueError):
-            protocol.CustomCommandSmallMessage._generate_body(type_=239)
-
-        # Upper bound
-        with self.assertRaises(ValueError):
-            protocol.CustomCommandSmallMessage._generate_body(type_=254)
+    def test_generate_set_credit_wipe_restricted_flag_body__various_days__ok(self):
+        generate_body = (
+            ExtendedSmallMessage.generate_set_credit_wipe_restricted_flag_body
+        )
+        for id_, days, body in zip(_WIPE_IDS, _WIPE_DAYS, _WIPE_BODIES):
+            body_bits = generate_body(id_, days)
+            self.assertEqual(body_bits.uint, body, msg="days={}".format(days))
 
     def test_generate_set_credit_various_fixed_test_messages__keycode_expected(self):
-        secret_key = b"\xfe" * 8 + b"\xa2" * 8
-        # Test vectors used for end-to-end testing on the embedded side
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=0,
-            days=915,
-            secret_key=secret_key)
-
-        self.assertEqual(0, message.final_message_id)
-        self.assertEqual("155 222 234 423 344", message.to_keycode())
-
         # Test vectors used for end-to-end testing on the embedded side
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=5,
-            days=1,
-            secret_key=secret_key)
-
-        self.assertEqual(5, message.final_message_id)
-        self.assertEqual("144 254 333 543 553", message.to_keycode())
-
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=22,
-            days=0,
-            secret_key=secret_key)
-
-        self.assertEqual(22, message.final_message_id)
-        self.assertEqual("133 432 252 333 332", message.to_keycode())
-
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=60,
-            days=protocol.SmallMessage.UNLOCK_FLAG,
-            secret_key=secret_key)
+        secret_key = _KEY_FEA2
+        type_ = ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG
+        build = ExtendedSmallMessage
 
-        self.assertEqual(60, message.final_message_id)
-        self.assertEqual("123 245 222 535 225", message.to_keycode())
+        for id_, days, keycode in zip(_WIPE_IDS, _WIPE_DAYS, _WIPE_KEYCODES):
+            message = build(type_, id_=id_, days=days, secret_key=secret_key)
 
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=90,
-            days=365,
-            secret_key=secret_key)
-
-        self.assertEqual(90, message.final_message_id)
-        self.assertEqual("132 223 555 342 554", message.to_keycode())
-
-        message = protocol.ExtendedSmallMessage(
-            protocol.ExtendedSmallMessageType.SET_CREDIT_WIPE_RESTRICTED_FLAG,
-            id_=120,
-            days=30,
-            secret_key=secret_key)
-
-        self.assertEqual(120, message.final_message_id)
-        self.assertEqual("143 525 243 432 322", message.to_keycode())
+            self.assertEqual(id_, message.final_message_id)
+            self.assertEqual(keycode, message.to_keycode(), msg="days={}".format(days))
 
 
 class TestSmallMessage(TestCase):
+    def test_init__without_key_or_schedule__raises(self):
+        self.assertRaises(
+            ValueError,
+            SmallMessage,
+            100,
+            SmallMessageType.ADD_CREDIT,
+            10,
+            None,
+        )
+
     def test_to_keycode__without_prefix__raises(self):
-        message = protocol.SmallMessage(
-            100, protocol.SmallMessageType.ADD_CREDIT, 10, b"\xff" * 16
+        message = SmallMessage(
+            100, SmallMessageType.ADD_CREDIT, 10, _KEY_FF
         )
         self.assertRaises(ValueError, message.to_keycode, prefix="")
 
     def test_to_keycode__without_required_keys__raises(self):
-        message = protocol.SmallMessage(
-            100, protocol.SmallMessageType.ADD_CREDIT, 10, b"\xff" * 16
+        message = SmallMessage(
+            100, SmallMessageType.ADD_CREDIT, 10, _KEY_FF
         )
         self.assertRaises(
             KeyError, message.to_keycode, prefix="*", key_dict={0: "a", 1: "b", 2: "c"}
         )
 
+    def test_to_keycode__group_len_four__last_group_shorter(self):
+        message = SmallMessage(
+            100, SmallMessageType.ADD_CREDIT, 10, _KEY_FF
+        )
+        self.assertEqual(
+            "4302-0220-0300-100",
+            message.to_keycode(
+                prefix="4",
+                separator="-",
+                group_len=4,
+                key_dict={0: "0", 1: "1", 2: "2", 3: "3"},
+            ),
+        )
+
     def test_to_keycode__with_simple_message___expected_value_returned(self):
-        message = protocol.SmallMessage(
-            100, protocol.SmallMessageType.ADD_CREDIT, 10, b"\xff" * 16
+        message = SmallMessage(
+            100, SmallMessageType.ADD_CREDIT, 10, _KEY_FF
         )
         self.assertEqual(
             "430 202 200 300 100",
@@ -531,30 +599,54 @@ class TestSmallMessage(TestCase):
         )
         self.assertEqual("152 424 422 522 322", message.to_keycode())
 
+    def test_to_keycode__repeated_calls__obscured_bits_reused(self):
+        message = SmallMessage(
+            100, SmallMessageType.ADD_CREDIT, 10, _KEY_FF
+        )
+
+        with mock.patch.object(
+            SmallMessage, "obscure", wraps=SmallMessage.obscure
+        ) as obscure:
+            self.assertEqual("152 424 422 522 322", message.to_keycode())
+            self.assertEqual(
+                "152-424-422-522-322", message.to_keycode(separator="-")
+            )
+            self.assertEqual("152 424 422 522 322", str(message))
+
+        self.assertEqual(1, obscure.call_count)
+
+        # unobscured rendering does not use the cached obscured bits
+        self.assertEqual(
+            "421 000 022 300 100",
+            message.to_keycode(
+                prefix="4", key_dict={0: "0", 1: "1", 2: "2", 3: "3"}, obscured=False
+            ),
+        )
+
     def test_str__with_simple_message___expected_value_returned(self):
-        message = protocol.SmallMessage(
-            100, protocol.SmallMessageType.ADD_CREDIT, 10, b"\xff" * 16
+        message = SmallMessage(
+            100, SmallMessageType.ADD_CREDIT, 10, _KEY_FF
         )
         self.assertEqual("152 424 422 522 322", str(message))
 
     def test_set_credit__possible_collision__message_is_not_created(self):
         self.assertRaises(
             ValueError,
-            protocol.SetCreditSmallMessage,
+            SetCreditSmallMessage,
             id_=63,
             days=1,
-            secret_key=b"\xff" * 16,
+            secret_key=_KEY_FF,
         )
 
     def test_init__long_key_inputs_accepted__uses_siphash_required_bytes(self):
-        xmessage = protocol.SmallMessage(
-            343, protocol.SmallMessageType.ADD_CREDIT, 20, b"\xfb\x00\xa5\x98" * 4
+        xmessage = SmallMessage(
+            343, SmallMessageType.ADD_CREDIT, 20, _KEY_FB00A598
         )
-        ymessage = protocol.SmallMessage(
+        ymessage = SmallMessage(
             343,
-            protocol.SmallMessageType.ADD_CREDIT,
+            SmallMessageType.ADD_CREDIT,
             20,
-            b"\xfb\x00\xa5\x98" * 4 + b"\x02\x03\x04\x05" * 4,
+            _KEY_FB00A598 + b"\x02\x03\x04\x05" * 4,
         )
         self.assertEqual(str(xmessage), str(ymessage))
         self.assertEqual(repr(xmessage), repr(ymessage))
@@ -562,20 +654,20 @@ class TestSmallMessage(TestCase):
 
     def test_repr__simple_message__expected_snippets_present(self):
         repred = repr(
-            protocol.SmallMessage(
-                100, protocol.SmallMessageType.ADD_CREDIT, 10, b"\xff" * 16
+            SmallMessage(
+                100, SmallMessageType.ADD_CREDIT, 10, _KEY_FF
             )
         )
         self.assertIn("SmallMessage", repred)
         repred = repr(
-            protocol.SmallMessage(
-                100, protocol.SmallMessageType.SET_CREDIT, 10, b"\xff" * 16
+            SmallMessage(
+                100, SmallMessageType.SET_CREDIT, 10, _KEY_FF
             )
         )
         self.assertIn("SmallMessage", repred)
         repred = repr(
-            protocol.SmallMessage(
-                100, protocol.SmallMessageType.MAINTENANCE_TEST, 10, b"\xff" * 16
+            SmallMessage(
+                100, SmallMessageType.MAINTENANCE_TEST, 10, _KEY_FF
             )
         )
         self.assertIn("SmallMessage", repred)
@@ -1,18 +1,30 @@
+from collections import namedtuple
 from unittest import TestCase
 
 import bitstring
+import siphash
 
 from nexus_keycode.protocols.utils import (
+    digest_to_int,
     full_deobscure,
     full_obscure,
     generate_mac,
-    pseudorandom_bits
+    pseudorandom_bits,
+    siphash24,
+    siphash24_batch,
+    siphash_from_schedule,
+    siphash_key_schedule,
 )
 
 
+_ObscureCase = namedtuple("_ObscureCase", "plain obscured_digit_count obscured")
+
+
 class TestModule(TestCase):
-    def test_pseudorandom_bits__varied_seeds__output_bits_are_expected(self):
-        scenarios = [
+    # (seed bits, expected pseudorandom output bits)
+    _PRB_SCENARIOS = tuple(
+        (bitstring.Bits(seed), bitstring.Bits(expected))
+        for (seed, expected) in [
             ("0b0111", "0b111010100010110"),
             ("0b0110", "0b000100001011100"),
             ("", "0b100011011100010"),
@@ -20,55 +32,54 @@ class TestModule(TestCase):
             ("0x6fa", "0b0000000010111001"),
             ("0x06fa", "0b0000000010111001"),
         ]
+    )
 
-        for (seed_bin, expected_bin) in scenarios:
-            seed = bitstring.Bits(seed_bin)
-            expected = bitstring.Bits(expected_bin)
+    _OBSCURE_CASES = (
+        _ObscureCase("12345678901250", 8, "57458927901250"),
+        _ObscureCase("12345678901241", 8, "05094833901241"),
+        _ObscureCase("00000000524232", 8, "57396884524232"),
+        _ObscureCase("00000000445755", 8, "03605158445755"),
+        _ObscureCase("0000000793477", 7, "0043384793477"),
+        _ObscureCase("000000693466", 6, "701319693466"),
+        _ObscureCase("00000593455", 5, "29244593455"),
+        _ObscureCase("0000493444", 4, "7284493444"),
+        _ObscureCase("000393433", 3, "119393433"),
+        _ObscureCase("00293422", 2, "45293422"),
+        _ObscureCase("0193411", 1, "8193411"),
+    )
+
+    def test_pseudorandom_bits__varied_seeds__output_bits_are_expected(self):
+        for (seed, expected) in self._PRB_SCENARIOS:
             output = pseudorandom_bits(seed, expected.len)
 
-            self.assertEqual(output, expected)
-
-    def test_full_obscure__spec_values__ok(self):
-        def assert_full_obscure_ok(message, obscured_digit_count, output):
-            self.assertEqual(full_obscure(message, obscured_digit_count=obscured_digit_count), output)
-
-        cases = [
-            ["12345678901250", 8, "57458927901250"],
-            ["12345678901241", 8, "05094833901241"],
-            ["00000000524232", 8, "57396884524232"],
-            ["00000000445755", 8, "03605158445755"],
-            ["0000000793477", 7, "0043384793477"],
-            ["000000693466", 6, "701319693466"],
-            ["00000593455", 5, "29244593455"],
-            ["0000493444", 4, "7284493444"],
-            ["000393433", 3, "119393433"],
-            ["00293422", 2, "45293422"],
-            ["0193411", 1, "8193411"],
-        ]
+            self.assertEqual(output, expected, msg="seed={!r}".format(seed))
 
-        for case in cases:
-            assert_full_obscure_ok(*case)
-
-    def test_full_deobscure__spec_values__ok(self):
-        def assert_full_deobscure_ok(message, obscured_digit_count, output):
-            self.assertEqual(full_deobscure(message, obscured_digit_count=obscured_digit_count), output)
-
-        cases = [
-            ["57458927901250", 8, "12345678901250"],
-            ["05094833901241", 8, "12345678901241"],
-            ["57396884524232", 8, "00000000524232"],
-            ["03605158445755", 8, "00000000445755"],
-            ["0043384793477", 7, "0000000793477"],
-            ["701319693466", 6, "000000693466"],
-            ["29244593455", 5, "00000593455"],
-            ["7284493444", 4, "0000493444"],
-            ["119393433", 3, "000393433"],
-            ["45293422", 2, "00293422"],
-            ["8193411", 1, "0193411"],
-        ]
+    def test_full_obscure__spec_values__round_trip_ok(self):
+        for case in self._OBSCURE_CASES:
+            count = case.obscured_digit_count
+            result = full_obscure(case.plain, obscured_digit_count=count)
+            self.assertEqual(result, case.obscured, msg=case.plain)
+            self.assertEqual(
+                full_deobscure(result, obscured_digit_count=count),
+                case.plain,
+                msg=case.plain,
+            )
+
+    def test_full_obscure__various_checks__matches_pseudorandom_bits(self):
+        for check in [0, 1, 193411, 524232, 999999]:
+            digits = "12345678{:06d}".format(check)
+            pr_bits = pseudorandom_bits(bitstring.pack("uintle:32", check), 64)
+            expected = "".join(
+                str((int(d) + pr_bits[i * 8 : i * 8 + 8].uint) % 10)
+                for (i, d) in enumerate(digits[:8])
+            ) + digits[8:]
+
+            self.assertEqual(full_obscure(digits), expected)
 
-        for case in cases:
-            assert_full_deobscure_ok(*case)
+    def test_full_obscure__too_many_obscured_digits__raises(self):
+        self.assertRaises(
+            ValueError, full_obscure, "123456789193411", obscured_digit_count=9
+        )
 
     def test_generate_mac__standard_input__output_expected(self):
         input_val = b"\x00"
@@ -76,3 +87,63 @@ class TestModule(TestCase):
         mac = generate_mac(input_val, secret_key)
 
         self.assertEqual(mac, "875838")
+
+    def test_generate_mac__various_inputs_and_keys__matches_reference(self):
+        keys = [b"\x00" * 16, b"\xff" * 16, b"\xde\xad\xbe\xef" * 4]
+        input_vals = [b"", b"\x00", b"\x01" * 9, b"\x12\xab" * 8]
+
+        for secret_key in keys:
+            for input_val in input_vals:
+                check = siphash.SipHash_2_4(secret_key, input_val).hash()
+                expected = u"{:06d}".format((check & 0xFFFFFFFF) % 1000000)
+
+                self.assertEqual(
+                    generate_mac(input_val, secret_key),
+                    expected,
+                    msg="key={!r}, input={!r}".format(secret_key, input_val),
+                )
+
+    def test_siphash24__standard_input__matches_reference(self):
+        secret_key = b"\x38\x79\x2f\xfc\x24\x1c\x2b\xc7\xc8\xcb\xf6\x24\x59\x3b\x57\x63"
+        for input_val in [b"", b"\x00", b"\x01" * 7, b"\xfe" * 9, b"\x12\xab" * 8]:
+            reference = siphash.SipHash_2_4(secret_key, input_val)
+            digest = siphash24(secret_key, input_val)
+
+            self.assertEqual(digest, reference.digest())
+            self.assertEqual(digest_to_int(digest), reference.hash())
+
+    def test_siphash24__text_input__raises(self):
+        self.assertRaises(TypeError, siphash24, b"\x00" * 16, u"\x00\x01")
+
+    def test_siphash_key_schedule__same_key__state_reused(self):
+        secret_key = b"\xfe" * 8 + b"\xa2" * 8
+        schedule = siphash_key_schedule(secret_key)
+
+        self.assertIs(schedule, siphash_key_schedule(bytearray(secret_key)))
+        self.assertIsInstance(schedule, tuple)
+
+    def test_siphash_from_schedule__updated__schedule_unchanged(self):
+        secret_key = b"\xc4\xb8@H\xcf\x04$\xa2]\xc5\xe9\xd3\xf0g@6"
+        schedule = siphash_key_schedule(secret_key)
+
+        hasher = siphash_from_schedule(schedule).update(b"\x01" * 11)
+
+        self.assertEqual(
+            hasher.hash(), siphash.SipHash_2_4(secret_key, b"\x01" * 11).hash()
+        )
+        self.assertIs(schedule, siphash_key_schedule(secret_key))
+        self.assertEqual(
+            siphash_from_schedule(schedule).hash(),
+            siphash.SipHash_2_4(secret_key).hash(),
+        )
+
+    def test_siphash24_batch__several_inputs__matches_single_digests(self):
+        secret_key = b"\xab" * 16
+        input_vals = [b"\x1a\x00\x00\x00\x00\xb2\x00", b"", b"\xff" * 16]
+
+        self.assertEqual(
+            siphash24_batch(secret_key, input_vals),
+            [siphash24(secret_key, input_val) for input_val in input_vals],
+        )
+        self.assertEqual(siphash24_batch(secret_key, []), [])
+        self.assertRaises(TypeError, siphash24_batch, secret_key, [b"", u"a"])
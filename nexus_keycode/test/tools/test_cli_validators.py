@@ -0,0 +1,33 @@
+import argparse
+from unittest import TestCase
+
+from nexus_keycode.tools._cli_validators import (
+    check_secret_key,
+    make_message_type_checker,
+)
+
+
+class TestCliValidators(TestCase):
+    def test_message_type_checker__valid_type__returned(self):
+        check = make_message_type_checker(("SET", "ADD"))
+        self.assertEqual("ADD", check("ADD"))
+
+    def test_message_type_checker__invalid_type__raises(self):
+        check = make_message_type_checker(("SET", "ADD"))
+        self.assertRaises(argparse.ArgumentTypeError, check, "LINK")
+
+    def test_check_secret_key__valid_hex__decoded(self):
+        self.assertEqual(
+            b"\x12\xab" * 8, check_secret_key("12ab12ab12ab12ab12ab12ab12ab12ab")
+        )
+
+    def test_check_secret_key__invalid_hex__raises(self):
+        self.assertRaises(argparse.ArgumentTypeError, check_secret_key, "zz" * 16)
+
+    def test_check_secret_key__0x_prefixed_hex__raises(self):
+        self.assertRaises(
+            argparse.ArgumentTypeError, check_secret_key, "0x" + "ab" * 15
+        )
+
+    def test_check_secret_key__wrong_length__raises(self):
+        self.assertRaises(argparse.ArgumentTypeError, check_secret_key, "12ab")
@@ -2,11 +2,16 @@ from unittest import TestCase
 
 import nexus_keycode.protocols.full as protocol
 from nexus_keycode.tools.generate_full_keycode import (
+    _build_parser,
     create_full_channel_message,
     create_full_credit_message,
 )
 
 
+_KEY_12AB = b"\x12\xab" * 8
+_KEY_AB12 = b"\xab\x12" * 8
+
+
 class TestCreateFullCreditMessage(TestCase):
     def test_invalid_msg_type__raises(self):
         self.assertRaises(
@@ -14,24 +19,24 @@ class TestCreateFullCreditMessage(TestCase):
             create_full_credit_message,
             15,
             "INVALID_TYPE",
-            b"\x12\xab" * 8,
+            _KEY_12AB,
             hours=168,
         )
 
     def test_valid_add_credit__returns_expected(self):
-        msg = create_full_credit_message(15, "ADD", b"\x12\xab" * 8, hours=168)
+        msg = create_full_credit_message(15, "ADD", _KEY_12AB, hours=168)
         self.assertEqual(15, msg.full_id)
         self.assertEqual(protocol.FullMessageType.ADD_CREDIT, msg.message_type)
         self.assertEqual(u"*867 149 009 381 22#", msg.to_keycode())
 
     def test_valid_set_credit__returns_expected(self):
-        msg = create_full_credit_message(15, "SET", b"\x12\xab" * 8, hours=168)
+        msg = create_full_credit_message(15, "SET", _KEY_12AB, hours=168)
         self.assertEqual(15, msg.full_id)
         self.assertEqual(protocol.FullMessageType.SET_CREDIT, msg.message_type)
         self.assertEqual(u"*624 231 140 313 45#", msg.to_keycode())
 
     def test_valid_unlock__returns_expected(self):
-        msg = create_full_credit_message(15, "UNLOCK", b"\x12\xab" * 8)
+        msg = create_full_credit_message(15, "UNLOCK", _KEY_12AB)
         self.assertEqual(15, msg.full_id)
         # 'unlock' is a special case of set credit for full protocol
         self.assertEqual(protocol.FullMessageType.SET_CREDIT, msg.message_type)
@@ -44,20 +49,20 @@ class TestCreateFullChannelMessage(TestCase):
             ValueError,
             create_full_channel_message,
             "INVALID_TYPE",
-            b"\x12\xab" * 8,
+            _KEY_12AB,
             15,
-            b"\xab\x12" * 8,
+            _KEY_AB12,
             3,
         )
 
     def test_valid_unlink__returns_expected(self):
-        msg = create_full_channel_message("UNLINK", b"\x12\xab" * 8, 15)
+        msg = create_full_channel_message("UNLINK", _KEY_12AB, 15)
         self.assertEqual(protocol.FullMessageType.PASSTHROUGH_COMMAND, msg.message_type)
         self.assertEqual(u"*815 310 472 88#", msg.to_keycode())
 
     def test_valid_link__returns_expected(self):
         msg = create_full_channel_message(
-            "LINK", b"\x12\xab" * 8, 15, b"\xab\x12" * 8, 3
+            "LINK", _KEY_12AB, 15, _KEY_AB12, 3
         )
         self.assertEqual(protocol.FullMessageType.PASSTHROUGH_COMMAND, msg.message_type)
         self.assertEqual(u"*819 501 596 413 845#", msg.to_keycode())
@@ -67,7 +72,7 @@ class TestCreateFullChannelMessage(TestCase):
             ValueError,
             create_full_channel_message,
             "LINK",
-            b"\x12\xab" * 8,
+            _KEY_12AB,
             15,
             accessory_command_count=3,
         )
@@ -77,7 +82,18 @@ class TestCreateFullChannelMessage(TestCase):
             ValueError,
             create_full_channel_message,
             "LINK",
-            b"\x12\xab" * 8,
+            _KEY_12AB,
             15,
-            b"\xab\x12" * 8,
+            _KEY_AB12,
+        )
+
+
+class TestBuildParser(TestCase):
+    def test_parse_args__credit_arguments__key_decoded(self):
+        args = _build_parser().parse_args(
+            ["-t", "ADD", "-i", "15", "-k", "12ab" * 8, "-hr", "168"]
         )
+        self.assertEqual("ADD", args.message_type)
+        self.assertEqual(15, args.message_id)
+        self.assertEqual(_KEY_12AB, args.secret_key)
+        self.assertEqual(168, args.hours)
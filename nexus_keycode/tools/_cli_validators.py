@@ -0,0 +1,50 @@
+# Shared `argparse` argument validators for the keycode generator scripts.
+
+import argparse
+import binascii
+import re
+
+_HEX_DIGITS_RE = re.compile(r"\A[0-9a-fA-F]*\Z")
+
+
+def make_message_type_checker(message_types):
+    """Build an `argparse` type callable accepting only `message_types`.
+
+    :param message_types: valid message type names, ordered for display
+    :type message_types: tuple of str
+    :return: validator returning the message type as a str
+    """
+    valid_message_types = frozenset(message_types)
+
+    def check_message_type(message_type):
+        if message_type not in valid_message_types:
+            raise argparse.ArgumentTypeError(
+                u"'{}' is not in {}".format(message_type, list(message_types))
+            )
+        return str(message_type)
+
+    return check_message_type
+
+
+def check_secret_key(secret_key):
+    """Parse a hex-encoded 16-byte secret key.
+
+    :param secret_key: 32 hex characters
+    :type secret_key: str
+    :return: the decoded key
+    :rtype: bytes
+    """
+    if not _HEX_DIGITS_RE.match(secret_key):
+        raise argparse.ArgumentTypeError(
+            u"'{}' contains characters that are not valid hexadecimal values "
+            "(a-f, 0-9)".format(secret_key)
+        )
+
+    if len(secret_key) != 32:
+        raise argparse.ArgumentTypeError(
+            u"'{}' is not a 16-byte secret key (must be 32 hex characters)".format(
+                secret_key
+            )
+        )
+
+    return binascii.unhexlify(secret_key)
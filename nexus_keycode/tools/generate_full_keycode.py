@@ -2,37 +2,44 @@
 # Convenience script to generate keycodes 'on the fly' for testing/QA purposes.
 
 import argparse
-import codecs
 
-import nexus_keycode.protocols.full as protocol
-from nexus_keycode.protocols.channel_origin_commands import ChannelOriginAction
+from nexus_keycode.tools._cli_validators import (
+    check_secret_key,
+    make_message_type_checker,
+)
 
-VALID_NXK_MESSAGE_TYPES = ["SET", "UNLOCK", "ADD"]
-VALID_NXC_MESSAGE_TYPES = ["LINK", "UNLINK"]
+# Ordered, for display in error messages
+_NXK_MESSAGE_TYPES = ("SET", "UNLOCK", "ADD")
+_NXC_MESSAGE_TYPES = ("LINK", "UNLINK")
+
+VALID_NXK_MESSAGE_TYPES = frozenset(_NXK_MESSAGE_TYPES)
+VALID_NXC_MESSAGE_TYPES = frozenset(_NXC_MESSAGE_TYPES)
 
 
 def create_full_credit_message(msg_id, msg_type, secret_key, hours=None):
+    # Imported here so that loading this module (e.g. for argument parsing)
+    # does not pull in the protocol implementations.
+    import nexus_keycode.protocols.full as protocol
 
     if msg_type not in VALID_NXK_MESSAGE_TYPES:
         raise ValueError(
             u"Invalid message type, supported values are {}".format(
-                VALID_NXK_MESSAGE_TYPES
+                list(_NXK_MESSAGE_TYPES)
             )
         )
 
-    if msg_type == "UNLOCK":
-        return protocol.FullMessage.unlock(msg_id, secret_key)
-
-    if hours is None:
+    if hours is None and msg_type != "UNLOCK":
         raise ValueError(
             u"Expected non-null `hours` argument for message type {}".format(msg_type)
         )
 
-    if msg_type == "ADD":
-        return protocol.FullMessage.add_credit(msg_id, hours, secret_key)
-    else:
-        assert msg_type == "SET"
-        return protocol.FullMessage.set_credit(msg_id, hours, secret_key)
+    # msg_type -> FullMessage constructor taking (msg_id, hours, secret_key)
+    constructors = {
+        "ADD": protocol.FullMessage.add_credit,
+        "SET": protocol.FullMessage.set_credit,
+        "UNLOCK": lambda id_, _, key: protocol.FullMessage.unlock(id_, key),
+    }
+    return constructors[msg_type](msg_id, hours, secret_key)
 
 
 def create_full_channel_message(
@@ -42,11 +49,13 @@ def create_full_channel_message(
     accessory_sym_key=None,
     accessory_command_count=None,
 ):
+    import nexus_keycode.protocols.full as protocol
+    from nexus_keycode.protocols.channel_origin_commands import ChannelOriginAction
 
     if msg_type not in VALID_NXC_MESSAGE_TYPES:
         raise ValueError(
             u"Invalid message type, supported values are {}".format(
-                VALID_NXC_MESSAGE_TYPES
+                list(_NXC_MESSAGE_TYPES)
             )
         )
 
@@ -72,37 +81,10 @@ def create_full_channel_message(
         )
 
 
-if __name__ == "__main__":
-
-    def check_message_type(message_type):
-        VALID_MESSAGE_TYPES_ALL = VALID_NXK_MESSAGE_TYPES + VALID_NXC_MESSAGE_TYPES
-        if (
-            not isinstance(message_type, str)
-            or str(message_type) not in VALID_MESSAGE_TYPES_ALL
-        ):
-            raise argparse.ArgumentTypeError(
-                u"'{}' is not in {}".format(message_type, VALID_MESSAGE_TYPES_ALL)
-            )
-        return str(message_type)
-
-    def check_secret_key(secret_key):
-        try:
-            int(secret_key, 16)
-        except ValueError:
-            raise argparse.ArgumentTypeError(
-                u"'{}' contains characters that are not valid hexadecimal values "
-                "(a-f, 0-9)".format(secret_key)
-            )
-
-        if len(secret_key) != 32:
-            raise argparse.ArgumentTypeError(
-                u"'{}' is not a 16-byte secret key (must be 32 hex characters)".format(
-                    secret_key
-                )
-            )
-
-        decode_hex = codecs.getdecoder("hex_codec")
-        return decode_hex(secret_key)[0]
+def _build_parser():
+    check_message_type = make_message_type_checker(
+        _NXK_MESSAGE_TYPES + _NXC_MESSAGE_TYPES
+    )
 
     argparser = argparse.ArgumentParser(
         description="Generate credit or Channel keycodes for Nexus Keycode 'full' protocol.",
@@ -165,7 +147,11 @@ if __name__ == "__main__":
         help="Nexus Channel Accessory Command Count",
     )
 
-    args = argparser.parse_args()
+    return argparser
+
+
+if __name__ == "__main__":
+    args = _build_parser().parse_args()
 
     msg_type = args.message_type
     if msg_type in VALID_NXK_MESSAGE_TYPES:
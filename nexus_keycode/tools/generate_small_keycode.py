@@ -2,56 +2,47 @@
 # Convenience script to generate keycodes 'on the fly' for testing/QA purposes.
 
 import argparse
-import codecs
 import nexus_keycode.protocols.small as protocol
+from nexus_keycode.tools._cli_validators import (
+    check_secret_key,
+    make_message_type_checker,
+)
 
 
-VALID_MESSAGE_TYPES = ["SET", "UNLOCK", "ADD"]
+# Ordered, for display in error messages
+_MESSAGE_TYPES = ("SET", "UNLOCK", "ADD")
 
+VALID_MESSAGE_TYPES = frozenset(_MESSAGE_TYPES)
 
-def create_small_credit_message(msg_id, msg_type, secret_key, days=None):
 
-    if msg_type not in VALID_MESSAGE_TYPES:
-        raise ValueError(
-            u"Invalid message type, supported values are {}".format(VALID_MESSAGE_TYPES)
-        )
+def _create_unlock_message(msg_id, _days, secret_key):
+    return protocol.AddCreditSmallMessage(
+        msg_id, protocol.SmallMessage.UNLOCK_FLAG, secret_key
+    )
 
-    if msg_type == "SET":
-        msg = protocol.SetCreditSmallMessage(msg_id, days, secret_key)
-    elif msg_type == "ADD":
-        msg = protocol.AddCreditSmallMessage(msg_id, days, secret_key)
-    else:
-        assert msg_type == "UNLOCK"
-        msg = protocol.AddCreditSmallMessage(msg_id, protocol.SmallMessage.UNLOCK_FLAG, secret_key)
-    return msg
 
+# msg_type -> constructor taking (msg_id, days, secret_key)
+_CREDIT_CONSTRUCTORS = {
+    "SET": protocol.SetCreditSmallMessage,
+    "ADD": protocol.AddCreditSmallMessage,
+    "UNLOCK": _create_unlock_message,
+}
 
-if __name__ == "__main__":
 
-    def check_message_type(message_type):
-        if not isinstance(message_type, str) or str(message_type) not in VALID_MESSAGE_TYPES:
-            raise argparse.ArgumentTypeError(
-                "'{}' is not in {}".format(message_type, VALID_MESSAGE_TYPES)
-            )
-        return str(message_type)
-
-    def check_secret_key(secret_key):
-        try:
-            int(secret_key, 16)
-        except ValueError:
-            raise argparse.ArgumentTypeError(
-                "'{}' contains characters that are not valid hexadecimal values (a-f, 0-9)".format(
-                    secret_key
-                )
-            )
+def create_small_credit_message(msg_id, msg_type, secret_key, days=None):
 
-        if len(secret_key) != 32:
-            raise argparse.ArgumentTypeError(
-                "'{}' is not a 16-byte secret key (must be 32 hex characters)".format(secret_key)
+    if msg_type not in VALID_MESSAGE_TYPES:
+        raise ValueError(
+            u"Invalid message type, supported values are {}".format(
+                list(_MESSAGE_TYPES)
             )
+        )
+
+    return _CREDIT_CONSTRUCTORS[msg_type](msg_id, days, secret_key)
 
-        decode_hex = codecs.getdecoder("hex_codec")
-        return decode_hex(secret_key)[0]
+
+def _build_parser():
+    check_message_type = make_message_type_checker(_MESSAGE_TYPES)
 
     argparser = argparse.ArgumentParser(
         description="Generate credit keycodes for Nexus Keycode 'small' protocol.",
@@ -84,8 +75,12 @@ if __name__ == "__main__":
         "-d", "--days", required=True, type=int, help="Days of credit. Ignored for 'UNLOCK'"
     )
 
+    return argparser
+
+
+if __name__ == "__main__":
     # message_type, message_id, secret_key, days
-    args = argparser.parse_args()
+    args = _build_parser().parse_args()
 
     msg_type = args.message_type
     msg_id = args.message_id
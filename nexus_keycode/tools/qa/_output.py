@@ -0,0 +1,28 @@
+# CSV output shared by the QA integration test keycode generators.
+
+import csv
+import time
+
+
+def write_keycodes_csv(plan_name, header, rows):
+    """Write keycode rows to a new CSV in the working directory.
+
+    The filename is prefixed with the current UTC time, e.g.
+    `08312020_14h02m11s_UTC_<plan_name>_keycodes.csv`.
+
+    :param plan_name: test plan identifier used in the filename
+    :type plan_name: str
+    :param header: CSV column names
+    :type header: tuple of str
+    :param rows: one sequence of values per keycode, in `header` order
+    :type rows: iterable
+    :return: name of the file written
+    :rtype: str
+    """
+    now_utc_str = time.strftime(u"%m%d%Y_%Hh%Mm%Ss", time.gmtime())
+    out_filename = u"{}_UTC_{}_keycodes.csv".format(now_utc_str, plan_name)
+    with open(out_filename, "w") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return out_filename
@@ -9,96 +9,82 @@ To use,
 3. open the CSV that was generated
 """
 
-import csv
-import datetime
+import collections
 
 from nexus_keycode.tools.generate_full_keycode import create_full_credit_message
+from nexus_keycode.tools.qa._output import write_keycodes_csv
 
 # DEVICE DATA DEFINITION; before running, update this section!
 NX_KEYCODE_TEST_DEVICE = dict(
-    nx_device_id=123456789, sym_key="\xaa" * 16, message_id=30
+    nx_device_id=123456789, sym_key=b"\xaa" * 16, message_id=30
 )
 
+# A test step requiring a keycode; `hours` is required for "SET" and "ADD"
+Step = collections.namedtuple("Step", ["step_number", "keycode_type", "hours"])
+Step.__new__.__defaults__ = (None,)
+
 # test definition according to the linked test plan document above
-TEST_STEPS = [
-    dict(step_number=1.1, keycode_type="ADD", hours=1),
-    dict(step_number=1.2, keycode_type="ADD", hours=168),
-    dict(step_number=1.3, keycode_type="UNLOCK"),
-    dict(step_number=1.4, keycode_type="SET", hours=0),
-    dict(step_number=2.1, keycode_type="ADD", hours=240),
-    dict(step_number=3.1, keycode_type="ADD", hours=48),
-]
+TEST_STEPS = (
+    Step(step_number=1.1, keycode_type="ADD", hours=1),
+    Step(step_number=1.2, keycode_type="ADD", hours=168),
+    Step(step_number=1.3, keycode_type="UNLOCK"),
+    Step(step_number=1.4, keycode_type="SET", hours=0),
+    Step(step_number=2.1, keycode_type="ADD", hours=240),
+    Step(step_number=3.1, keycode_type="ADD", hours=48),
+)
 
 
 def create_keycodes(steps):
-    """Consume a list of dicts, each one describing a test step
-    that requires a keycode to be generated. Each dict should
-    include `step_number`, `keycode_type`, and any other
-    kwargs required to generate the keycode described in the step.
+    """Consume a sequence of `Step`s, each one describing a test step
+    that requires a keycode to be generated. The test device's message ID
+    is advanced past the generated keycodes once all of them succeed.
 
     Return a list of dicts including the keycode as well as state
     at the time of generating it, suitable for output or analysis."""
+    message_id = NX_KEYCODE_TEST_DEVICE["message_id"]
+    secret_key = NX_KEYCODE_TEST_DEVICE["sym_key"]
     keycodes = list()
     for step in steps:
-        # begin to populate output dict
-        keycode_data = dict(
-            step_number=step["step_number"],
-            nexus_id=NX_KEYCODE_TEST_DEVICE["nx_device_id"],
-        )
-
         # generate keycode
-        message = None
-        msg_args = dict(
-            msg_id=NX_KEYCODE_TEST_DEVICE["message_id"],
-            msg_type=step["keycode_type"],
-            secret_key=NX_KEYCODE_TEST_DEVICE["sym_key"],
-            hours=step.get("hours", None),
+        message = create_full_credit_message(
+            message_id, step.keycode_type, secret_key, step.hours
         )
 
-        message = create_full_credit_message(**msg_args)
-        assert message
+        keycodes.append(
+            dict(
+                step_number=step.step_number,
+                nexus_id=NX_KEYCODE_TEST_DEVICE["nx_device_id"],
+                msg_id=message_id,
+                msg_type=step.keycode_type,
+                secret_key=secret_key,
+                hours=step.hours,
+                keycode=message.to_keycode(),
+            )
+        )
 
         # increment message ID
-        NX_KEYCODE_TEST_DEVICE["message_id"] = NX_KEYCODE_TEST_DEVICE["message_id"] + 1
-
-        # update output dict
-        keycode_data.update(msg_args)
-        keycode_data.update(dict(keycode=message.to_keycode()))
-
-        keycodes.append(keycode_data)
+        message_id += 1
 
+    NX_KEYCODE_TEST_DEVICE["message_id"] = message_id
     return keycodes
 
 
 def print_keycodes(keycodes):
-    # print ordered headers to CSV outfile
-    now_utc_str = datetime.datetime.utcnow().strftime(u"%m%d%Y_%Hh%Mm%Ss")
-    out_filename = now_utc_str + u"_UTC_nxk_integration_test_v1-4-0_keycodes.csv"
-    with open(u"{}".format(out_filename), "w") as outfile:
-        writer = csv.DictWriter(
-            outfile,
-            fieldnames=[
-                "step_number",
-                "nexus_id",
-                "keycode_type",
-                "message_id",
-                "hours",
-                "keycode",
-            ],
-        )
-        writer.writeheader()
-
-        for keycode in keycodes:
-            writer.writerow(
-                {
-                    "step_number": keycode["step_number"],
-                    "nexus_id": keycode["nexus_id"],
-                    "keycode_type": keycode["msg_type"],
-                    "message_id": keycode["msg_id"],
-                    "hours": keycode["hours"],
-                    "keycode": keycode["keycode"],
-                }
+    write_keycodes_csv(
+        u"nxk_integration_test_v1-4-0",
+        ("step_number", "nexus_id", "keycode_type", "message_id", "hours", "keycode"),
+        (
+            (
+                keycode["step_number"],
+                keycode["nexus_id"],
+                keycode["msg_type"],
+                keycode["msg_id"],
+                keycode["hours"],
+                keycode["keycode"],
             )
+            for keycode in keycodes
+        ),
+    )
 
 
 if __name__ == "__main__":
@@ -15,7 +15,14 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/angaza/nexus-python",
     download_url="https://github.com/angaza/nexus-python/releases/download/1.5.1/nexus_keycode-1.5.1.tar.gz",
-    install_requires=["bitstring>=3.0.2", "enum34==1.1.6", "siphash==0.0.1", "typing>=3.7.4"],
+    install_requires=[
+        "bitstring>=3.0.2",
+        # Backports; the standard library provides these modules on Python 3
+        "enum34==1.1.6; python_version < '3.4'",
+        "siphash==0.0.1",
+        "typing>=3.7.4; python_version < '3.5'",
+    ],
+    extras_require={"speedups": ["csiphash>=0.0.5"]},
     test_suite="nose2.collector",
     include_package_data=True,
     classifiers=[